@@ -0,0 +1,54 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread safe LRU cache whose entries also expire `ttl_seconds` after
+    they were stored. The least recently used entries are evicted once
+    there are more than `max_size`.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def set_many(self, items):
+        """Store (key, value) pairs, they all expire together."""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self.lock:
+            for key, value in items:
+                self.entries[key] = (expires_at, value)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
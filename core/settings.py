@@ -1,4 +1,5 @@
 import os
+import json
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -45,6 +46,13 @@ X_CLIENT_SECRET = os.getenv("X_CLIENT_SECRET")
 X_REDIRECT_URI = APP_URL + "/X/callback/"
 X_UNINSTALL_URI = APP_URL + "/X/uninstall/"
 
+# Platform APIs the poster calls, PLATFORM_API_SIMULATOR_URL points all of them
+# at a local `manage.py runsimulator` for offline load and failure testing
+PLATFORM_API_SIMULATOR_URL = os.getenv("PLATFORM_API_SIMULATOR_URL")
+X_API_URL = PLATFORM_API_SIMULATOR_URL or "https://api.x.com"
+GRAPH_API_URL = PLATFORM_API_SIMULATOR_URL or "https://graph.facebook.com"
+LINKEDIN_API_URL = PLATFORM_API_SIMULATOR_URL or "https://api.linkedin.com"
+
 
 
 ALLOWED_HOSTS = [
@@ -161,11 +169,11 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": DB_DIR / "db.sqlite",
-    },
-    "OPTIONS": {
-        "timeout": 20,
-        "transaction_mode": "IMMEDIATE",
-        "init_command": "PRAGMA synchronous=3; PRAGMA cache_size=2000;",
+        "OPTIONS": {
+            "timeout": 20,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": "PRAGMA synchronous=3; PRAGMA cache_size=2000;",
+        },
     },
 }
 
@@ -181,6 +189,111 @@ CACHES = {
 }
 
 
+# Poster
+
+# Touched by the web app whenever posts change so the poster re-reads its schedule
+POSTER_WAKEUP_FILE = DB_DIR / "poster.wakeup"
+POSTER_WATCH_SECONDS = float(os.getenv("POSTER_WATCH_SECONDS", 1))
+POSTER_RESYNC_SECONDS = float(os.getenv("POSTER_RESYNC_SECONDS", 60))
+POSTER_HEAP_SIZE = int(os.getenv("POSTER_HEAP_SIZE", 1000))
+
+# One keep-alive connection pool per platform, shared by all deliveries
+POSTER_HTTP_TIMEOUT = float(os.getenv("POSTER_HTTP_TIMEOUT", 30))
+POSTER_HTTP_MAX_CONNECTIONS = int(os.getenv("POSTER_HTTP_MAX_CONNECTIONS", 100))
+POSTER_HTTP_KEEPALIVE_SECONDS = float(os.getenv("POSTER_HTTP_KEEPALIVE_SECONDS", 120))
+
+# JSON overrides for integrations.platforms.ratelimit.DEFAULT_RATE_LIMITS
+# ex: {"X": {"app": [10000, 86400], "account": [100, 900]}}
+POSTER_RATE_LIMITS = json.loads(os.getenv("POSTER_RATE_LIMITS", "{}"))
+# Deliveries wait in the tick at most this long for a token, longer waits go back
+# to the queue due when the bucket refills. Keep it well below POSTER_LEASE_SECONDS
+POSTER_RATE_LIMIT_MAX_WAIT = float(os.getenv("POSTER_RATE_LIMIT_MAX_WAIT", 30))
+POSTER_RATE_LIMIT_RETRIES = int(os.getenv("POSTER_RATE_LIMIT_RETRIES", 2))
+POSTER_RATE_LIMIT_BACKOFF = float(os.getenv("POSTER_RATE_LIMIT_BACKOFF", 60))
+
+# Failed deliveries retry with jittered exponential backoff, then go to dead letters
+POSTER_BATCH_SIZE = int(os.getenv("POSTER_BATCH_SIZE", 500))
+# Claimed deliveries go back to the queue if a worker does not finish them in time
+POSTER_LEASE_SECONDS = float(os.getenv("POSTER_LEASE_SECONDS", 600))
+# On shutdown in-flight deliveries get this long to finish, keep it below the
+# container's stop grace period
+POSTER_DRAIN_SECONDS = float(os.getenv("POSTER_DRAIN_SECONDS", 20))
+POSTER_RETRY_MAX_ATTEMPTS = int(os.getenv("POSTER_RETRY_MAX_ATTEMPTS", 6))
+POSTER_RETRY_BASE_DELAY = float(os.getenv("POSTER_RETRY_BASE_DELAY", 30))
+POSTER_RETRY_MAX_DELAY = float(os.getenv("POSTER_RETRY_MAX_DELAY", 3600))
+
+# X media is uploaded in segments, a few at a time, and failed uploads resume
+X_UPLOAD_SEGMENT_SIZE = int(os.getenv("X_UPLOAD_SEGMENT_SIZE", 4 * 1024 * 1024))
+X_UPLOAD_CONCURRENCY = int(os.getenv("X_UPLOAD_CONCURRENCY", 4))
+X_UPLOAD_SESSION_SECONDS = float(os.getenv("X_UPLOAD_SESSION_SECONDS", 3600))
+
+# Graph reads of many ids under one token are coalesced into one request
+GRAPH_BATCH_WINDOW_SECONDS = float(os.getenv("GRAPH_BATCH_WINDOW_SECONDS", 0.05))
+# Facebook and Instagram publishing calls go out as Graph batch requests
+GRAPH_BATCH_REQUESTS = os.getenv("GRAPH_BATCH_REQUESTS", "True").lower() == "true"
+IG_CONTAINER_POLL_SECONDS = float(os.getenv("IG_CONTAINER_POLL_SECONDS", 2))
+IG_CONTAINER_MAX_POLLS = int(os.getenv("IG_CONTAINER_MAX_POLLS", 30))
+
+# Prometheus text metrics, written to a file and optionally served on a port
+POSTER_METRICS_FILE = BASE_DIR / "logs/poster.prom"
+POSTER_METRICS_HOST = os.getenv("POSTER_METRICS_HOST", "127.0.0.1")
+POSTER_METRICS_PORT = int(os.getenv("POSTER_METRICS_PORT", 0))
+
+# runposter --profile: cProfile one tick in N and snapshot memory periodically
+POSTER_PROFILE_DIR = BASE_DIR / "logs/profiles"
+POSTER_PROFILE_SAMPLE_EVERY = int(os.getenv("POSTER_PROFILE_SAMPLE_EVERY", 10))
+POSTER_PROFILE_SNAPSHOT_SECONDS = float(
+    os.getenv("POSTER_PROFILE_SNAPSHOT_SECONDS", 300)
+)
+POSTER_PROFILE_KEEP = int(os.getenv("POSTER_PROFILE_KEEP", 20))
+
+# Media is uploaded and posts are checked this long before they are due, 0 disables
+POSTER_STAGING_SECONDS = float(os.getenv("POSTER_STAGING_SECONDS", 900))
+
+# Connections to the platforms due in the next POSTER_PREWARM_WINDOW_SECONDS are
+# opened this long before the burst, 0 disables
+POSTER_PREWARM_SECONDS = float(os.getenv("POSTER_PREWARM_SECONDS", 5))
+POSTER_PREWARM_WINDOW_SECONDS = float(os.getenv("POSTER_PREWARM_WINDOW_SECONDS", 60))
+POSTER_PREWARM_MAX_CONNECTIONS = int(os.getenv("POSTER_PREWARM_MAX_CONNECTIONS", 10))
+
+# Media nobody references anymore is deleted a batch at a time
+POSTER_MEDIA_GC_SECONDS = float(os.getenv("POSTER_MEDIA_GC_SECONDS", 600))
+POSTER_MEDIA_GC_BATCH_SIZE = int(os.getenv("POSTER_MEDIA_GC_BATCH_SIZE", 500))
+POSTER_MEDIA_GC_GRACE_SECONDS = float(os.getenv("POSTER_MEDIA_GC_GRACE_SECONDS", 3600))
+# Dead letters keep their media for replays this long, then it is released
+POSTER_DEAD_LETTER_MEDIA_SECONDS = float(
+    os.getenv("POSTER_DEAD_LETTER_MEDIA_SECONDS", 604800)
+)
+
+# Instagram links that were not readable at publish time are read again later
+POSTER_PERMALINK_SECONDS = float(os.getenv("POSTER_PERMALINK_SECONDS", 60))
+POSTER_PERMALINK_BATCH_SIZE = int(os.getenv("POSTER_PERMALINK_BATCH_SIZE", 100))
+POSTER_PERMALINK_MAX_AGE_SECONDS = float(
+    os.getenv("POSTER_PERMALINK_MAX_AGE_SECONDS", 86400)
+)
+
+# Calendar pages are cached per account, year and schedule version
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", 1000))
+CALENDAR_CACHE_SECONDS = float(os.getenv("CALENDAR_CACHE_SECONDS", 3600))
+
+# Integrations are kept between ticks, the web app's changes show up within the TTL
+POSTER_INTEGRATION_CACHE_SIZE = int(os.getenv("POSTER_INTEGRATION_CACHE_SIZE", 10000))
+POSTER_INTEGRATION_CACHE_SECONDS = float(
+    os.getenv("POSTER_INTEGRATION_CACHE_SECONDS", 60)
+)
+
+# Tokens are refreshed this long before they expire, several accounts at a time
+POSTER_TOKEN_REFRESH_MARGIN = float(os.getenv("POSTER_TOKEN_REFRESH_MARGIN", 900))
+POSTER_TOKEN_REFRESH_WORKERS = int(os.getenv("POSTER_TOKEN_REFRESH_WORKERS", 8))
+POSTER_TOKEN_REFRESH_RESYNC_SECONDS = float(
+    os.getenv("POSTER_TOKEN_REFRESH_RESYNC_SECONDS", 300)
+)
+
+# Decrypted integration tokens kept in memory, 0 disables the cache
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_SECONDS = float(os.getenv("TOKEN_CACHE_SECONDS", 300))
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -1,4 +1,39 @@
 from django.contrib import admin
-from .models import IntegrationsModel
+from .models import IntegrationsModel, PostDelivery, DeadLetter, PublishLedger
+from .scheduler import notify_poster
 
 admin.site.register(IntegrationsModel)
+
+
+@admin.register(PostDelivery)
+class PostDeliveryAdmin(admin.ModelAdmin):
+    list_display = [
+        "post",
+        "platform",
+        "state",
+        "attempts",
+        "due_at",
+        "result_url",
+        "error",
+    ]
+    list_filter = ["platform", "state"]
+
+
+@admin.action(description="Replay selected dead letters")
+def replay_dead_letters(modeladmin, request, queryset):
+    for dead_letter in queryset:
+        dead_letter.replay()
+    notify_poster()
+
+
+@admin.register(DeadLetter)
+class DeadLetterAdmin(admin.ModelAdmin):
+    list_display = ["post", "platform", "attempts", "error", "created_at"]
+    list_filter = ["platform"]
+    actions = [replay_dead_letters]
+
+
+@admin.register(PublishLedger)
+class PublishLedgerAdmin(admin.ModelAdmin):
+    list_display = ["key", "state", "worker", "result_url", "started_at", "finished_at"]
+    list_filter = ["platform", "state"]
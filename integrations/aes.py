@@ -1,7 +1,9 @@
 import uuid
+from functools import lru_cache
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 from hashlib import sha256
+from core.cache import TTLCache
 
 
 class AESCBC:
@@ -25,10 +27,34 @@ class AESCBC:
         return f"{cipher.iv.hex()}:{ciphertext.hex()}"
 
     def decrypt(self, encrypted_text: str):
-        iv_hex = encrypted_text.split(":")[0]
-        encrypted_text_hex = encrypted_text.split(":")[1]
-        iv = bytes.fromhex(iv_hex)
-        encrypted_text = bytes.fromhex(encrypted_text_hex)
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
-        plaintext = unpad(cipher.decrypt(encrypted_text), AES.block_size)
+        iv_hex, encrypted_text_hex = encrypted_text.split(":", 1)
+        cipher = AES.new(self.key, AES.MODE_CBC, bytes.fromhex(iv_hex))
+        plaintext = unpad(
+            cipher.decrypt(bytes.fromhex(encrypted_text_hex)), AES.block_size
+        )
         return plaintext.decode()
+
+
+@lru_cache(maxsize=8)
+def get_cipher(secret_key: str):
+    """Shared AESCBC per key, deriving the key is the slow part of a decrypt."""
+    return AESCBC(secret_key)
+
+
+class DecryptedCache(TTLCache):
+    """
+    Bounded TTL cache of decrypted values. Entries remember the encrypted
+    text they came from and are ignored once it changes.
+    """
+
+    def get_value(self, key, encrypted_text: str):
+        entry = self.get(key)
+        if entry is None or entry[0] != encrypted_text:
+            return None
+        return entry[1]
+
+    def set_values(self, items: list[tuple]):
+        """Store (key, encrypted text, value) items."""
+        self.set_many(
+            (key, (encrypted_text, value)) for key, encrypted_text, value in items
+        )
@@ -0,0 +1,339 @@
+import json
+import time
+import random
+import itertools
+import resource
+import tracemalloc
+from datetime import timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+from urllib.parse import parse_qs
+import httpx
+from core import settings
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from socialsched.models import PostModel, get_due_at_utc
+from .aes import AESCBC, get_cipher
+from .models import (
+    IntegrationsModel,
+    Platform,
+    PostDelivery,
+    DeliveryState,
+    token_cache,
+)
+from .platforms import transport
+from .platforms.ratelimit import rate_limiter
+from .repository import integration_repository
+from . import post_management
+
+
+SEED_BATCH_SIZE = 5000
+
+TIMEZONES = [
+    "UTC",
+    "Europe/Bucharest",
+    "Europe/London",
+    "America/New_York",
+    "America/Sao_Paulo",
+    "America/Los_Angeles",
+    "Asia/Tokyo",
+    "Asia/Kolkata",
+    "Australia/Sydney",
+]
+
+# Text posts go to any mix of these, Instagram posts always carry an image
+TEXT_PLATFORMS = [
+    Platform.X_TWITTER.value,
+    Platform.LINKEDIN.value,
+    Platform.FACEBOOK.value,
+]
+
+PLATFORM_FIELDS = {
+    Platform.X_TWITTER.value: "post_on_x",
+    Platform.LINKEDIN.value: "post_on_linkedin",
+    Platform.FACEBOOK.value: "post_on_facebook",
+    Platform.INSTAGRAM.value: "post_on_instagram",
+}
+
+
+def handle_platform_request(request: httpx.Request):
+    """Answer every platform call the posters make with a minimal success."""
+    path = request.url.path
+    if request.method == "POST" and path.endswith("/"):
+        batch = json.loads(parse_qs(request.content.decode())["batch"][0])
+        return httpx.Response(
+            200,
+            json=[
+                {
+                    "code": 200,
+                    "body": json.dumps({"id": "1_1", "post_id": "1_1"}),
+                }
+                for _ in batch
+            ],
+        )
+    if path.endswith("/tweets"):
+        return httpx.Response(200, json={"data": {"id": "1"}})
+    if path.endswith("/ugcPosts"):
+        return httpx.Response(201, json={"id": "urn:li:share:1"})
+    if path.endswith(("/feed", "/photos")):
+        return httpx.Response(200, json={"id": "1_1", "post_id": "1_1"})
+    if path.endswith("/media_publish"):
+        return httpx.Response(200, json={"id": "1"})
+    if path.endswith("/media"):
+        return httpx.Response(200, json={"id": "1"})
+    ids = request.url.params.get("ids", "").split(",")
+    return httpx.Response(
+        200,
+        json={
+            object_id: {
+                "status_code": "FINISHED",
+                "permalink": "https://www.instagram.com/p/1/",
+            }
+            for object_id in ids
+        },
+    )
+
+
+def stub_platform_clients():
+    post_management.get_poster_loop()
+    for platform in PLATFORM_FIELDS:
+        transport._clients[platform] = httpx.AsyncClient(
+            transport=httpx.MockTransport(handle_platform_request)
+        )
+    # The benchmark measures the poster, not the platform quotas
+    rate_limiter.limits = {}
+    rate_limiter.buckets.clear()
+
+
+def seed_integrations(accounts: int):
+    access_token = get_cipher(settings.SECRET_KEY).encrypt("benchmark-token")
+    access_expire = timezone.now() + timedelta(days=365)
+    IntegrationsModel.objects.bulk_create(
+        [
+            IntegrationsModel(
+                account_id=account_id,
+                user_id=str(account_id),
+                access_token=access_token,
+                access_expire=access_expire,
+                platform=platform,
+            )
+            for account_id in range(1, accounts + 1)
+            for platform in PLATFORM_FIELDS
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+
+def make_post(rng: random.Random, accounts: int, due_at_utc, post_timezone: str):
+    if rng.random() < 0.2:
+        platforms = [Platform.INSTAGRAM.value, Platform.FACEBOOK.value]
+        media_file = "benchmark.jpg"
+    else:
+        platforms = rng.sample(TEXT_PLATFORMS, rng.randint(1, len(TEXT_PLATFORMS)))
+        media_file = None
+
+    # scheduled_on holds the wall clock time in post_timezone
+    wall_clock = due_at_utc.astimezone(ZoneInfo(post_timezone))
+    scheduled_on = wall_clock.replace(tzinfo=dt_timezone.utc)
+    post = PostModel(
+        scheduled_on=scheduled_on,
+        post_timezone=post_timezone,
+        due_at_utc=get_due_at_utc(scheduled_on, post_timezone),
+        account_id=rng.randint(1, accounts),
+        description=f"Benchmark post {rng.random()}",
+        media_file=media_file,
+        **{PLATFORM_FIELDS[platform]: True for platform in platforms},
+    )
+    return post, platforms
+
+
+def seed_posts(rows: int, due_rows: int, accounts: int, seed: int = 0):
+    """
+    Seed `rows` posts spread over the next year, `due_rows` of them already due,
+    with their delivery rows, the way PostModel.save would create them.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    created = 0
+    while created < rows:
+        batch_size = min(SEED_BATCH_SIZE, rows - created)
+        posts = []
+        selections = []
+        for index in range(created, created + batch_size):
+            post_timezone = rng.choice(TIMEZONES)
+            if index < due_rows:
+                offset = -timedelta(minutes=rng.randint(1, 60))
+            else:
+                offset = timedelta(minutes=rng.randint(60, 525600))
+            due_at_utc = (now + offset).replace(microsecond=0)
+            post, platforms = make_post(rng, accounts, due_at_utc, post_timezone)
+            posts.append(post)
+            selections.append(platforms)
+
+        PostModel.objects.bulk_create(posts, batch_size=SEED_BATCH_SIZE)
+        PostDelivery.objects.bulk_create(
+            [
+                PostDelivery(
+                    post_id=post.id, platform=platform, due_at=post.due_at_utc
+                )
+                for post, platforms in zip(posts, selections)
+                for platform in platforms
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        created += batch_size
+
+
+def get_max_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_ticks(ticks: int):
+    """Run poster ticks and measure latency, throughput and queries of each."""
+    results = []
+    for _ in range(ticks):
+        published_before = PostDelivery.objects.filter(
+            state=DeliveryState.PUBLISHED
+        ).count()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            post_management.post_scheduled_posts()
+            elapsed = time.perf_counter() - started
+        published = (
+            PostDelivery.objects.filter(state=DeliveryState.PUBLISHED).count()
+            - published_before
+        )
+        results.append(
+            {
+                "seconds": elapsed,
+                "deliveries": published,
+                "deliveries_per_second": published / elapsed if elapsed else 0,
+                "queries": len(queries),
+            }
+        )
+    return results
+
+
+def measure_tick_memory():
+    tracemalloc.start()
+    try:
+        post_management.post_scheduled_posts()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def summarize(values: list[float]):
+    values = sorted(values)
+    return {
+        "min": values[0],
+        "median": values[len(values) // 2],
+        "max": values[-1],
+        "mean": sum(values) / len(values),
+    }
+
+
+def bench_tick(rows: int, options: dict):
+    ticks = options["ticks"]
+    accounts = options["accounts"] or max(rows // 100, 1)
+    # Enough due deliveries for every timed tick and the traced one
+    due_rows = min(rows, settings.POSTER_BATCH_SIZE * (ticks + 1))
+
+    started = time.perf_counter()
+    # Cases share the process but each gets a fresh database
+    integration_repository.clear()
+    seed_integrations(accounts)
+    seed_posts(rows, due_rows, accounts, options["seed"])
+    seed_seconds = time.perf_counter() - started
+
+    stub_platform_clients()
+    tick_results = run_ticks(ticks)
+    peak_memory = measure_tick_memory()
+
+    tick_seconds = summarize([tick["seconds"] for tick in tick_results])
+    deliveries_per_second = summarize(
+        [tick["deliveries_per_second"] for tick in tick_results]
+    )
+    queries_per_tick = summarize([tick["queries"] for tick in tick_results])
+    return {
+        "summary": (
+            f"median tick {tick_seconds['median']:.3f}s, "
+            f"{deliveries_per_second['median']:.0f} deliveries/s, "
+            f"{queries_per_tick['median']} queries/tick"
+        ),
+        "rows": rows,
+        "accounts": accounts,
+        "deliveries": PostDelivery.objects.count(),
+        "seed_seconds": seed_seconds,
+        "ticks": tick_results,
+        "tick_seconds": tick_seconds,
+        "deliveries_per_second": deliveries_per_second,
+        "queries_per_tick": queries_per_tick,
+        "tick_peak_traced_bytes": peak_memory,
+        "max_rss_bytes": get_max_rss(),
+    }
+
+
+def time_per_call(function, calls: int):
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - started) / calls
+
+
+def bench_aes(options: dict):
+    """Compare the per call cost of the token decryption paths."""
+    tokens = options["accounts"] or 1000
+    calls = tokens * options["ticks"]
+    aes_cbc = get_cipher(settings.SECRET_KEY)
+    integrations = [
+        IntegrationsModel(
+            pk=index,
+            account_id=index,
+            platform=Platform.X_TWITTER.value,
+            access_token=aes_cbc.encrypt(f"benchmark-token-{index}"),
+        )
+        for index in range(1, tokens + 1)
+    ]
+    encrypted_text = integrations[0].access_token
+    rotation = itertools.cycle(integrations)
+    token_cache.clear()
+    seconds = {
+        "new_cipher_decrypt": time_per_call(
+            lambda: AESCBC(settings.SECRET_KEY).decrypt(encrypted_text), calls
+        ),
+        "shared_cipher_decrypt": time_per_call(
+            lambda: aes_cbc.decrypt(encrypted_text), calls
+        ),
+    }
+
+    started = time.perf_counter()
+    IntegrationsModel.decrypt_tokens(integrations)
+    seconds["bulk_decrypt"] = (time.perf_counter() - started) / tokens
+    seconds["cached_token_value"] = time_per_call(
+        lambda: next(rotation).access_token_value, calls
+    )
+    token_cache.clear()
+
+    speedup = seconds["new_cipher_decrypt"] / seconds["cached_token_value"]
+    return {
+        "summary": (
+            f"new cipher {seconds['new_cipher_decrypt'] * 1e6:.1f}us, "
+            f"shared {seconds['shared_cipher_decrypt'] * 1e6:.1f}us, "
+            f"cached {seconds['cached_token_value'] * 1e6:.1f}us "
+            f"({speedup:.0f}x)"
+        ),
+        "tokens": tokens,
+        "calls": calls,
+        "seconds_per_call": seconds,
+    }
+
+
+CASES = {
+    "tick-10k": lambda options: bench_tick(10_000, options),
+    "tick-100k": lambda options: bench_tick(100_000, options),
+    "tick-1m": lambda options: bench_tick(1_000_000, options),
+    "aes": bench_aes,
+}
@@ -0,0 +1,81 @@
+import json
+import sqlite3
+import platform
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from core import settings
+from core.logger import log
+from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
+from integrations.benchmark import CASES
+from integrations.post_management import close_poster_loop
+
+
+class Command(BaseCommand):
+    help = "Benchmark the poster against a throwaway database and stubbed platforms."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "cases",
+            nargs="*",
+            default=["tick-10k"],
+            help=f"Cases to run: {', '.join(CASES)}",
+        )
+        parser.add_argument("--ticks", type=int, default=5)
+        parser.add_argument(
+            "--accounts",
+            type=int,
+            default=None,
+            help="Accounts to spread posts over, defaults to one per 100 posts.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output",
+            type=Path,
+            default=None,
+            help="JSON results file, defaults to logs/bench/benchposter-<time>.json",
+        )
+
+    def run_case(self, name: str, options: dict):
+        # Each case gets a fresh on-disk database so results match production IO
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_name = str(Path(tmp_dir) / "bench.sqlite")
+            connection.settings_dict["TEST"]["NAME"] = test_name
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                return CASES[name](options)
+            finally:
+                close_poster_loop()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options["cases"] if name not in CASES]
+        if unknown:
+            raise CommandError(f"Unknown cases: {', '.join(unknown)}")
+
+        started_at = datetime.now()
+        report = {
+            "started_at": started_at.isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "options": {
+                key: options[key] for key in ("ticks", "accounts", "seed")
+            },
+            "cases": {},
+        }
+
+        for name in options["cases"]:
+            log.info(f"Running benchmark case {name}")
+            result = self.run_case(name, options)
+            report["cases"][name] = result
+            log.info(f"{name}: {result['summary']}")
+
+        output = options["output"] or (
+            settings.BASE_DIR
+            / "logs/bench"
+            / f"benchposter-{started_at.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        log.info(f"Benchmark results written to {output}")
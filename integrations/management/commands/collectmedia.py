@@ -0,0 +1,40 @@
+from core.logger import log
+from django.core.management.base import BaseCommand
+from integrations.media import MediaCollector, index_media_root
+
+
+class Command(BaseCommand):
+    help = "Delete media files no post references anymore."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--index",
+            action="store_true",
+            help="Index files already in MEDIA_ROOT before collecting.",
+        )
+        parser.add_argument(
+            "--grace-seconds",
+            type=float,
+            default=None,
+            help="Only delete files indexed at least this long ago.",
+        )
+
+    def handle(self, *args, **options):
+        if options["index"]:
+            indexed = index_media_root()
+            log.info(f"Indexed {indexed} media files.")
+
+        collector = MediaCollector()
+        if options["grace_seconds"] is not None:
+            collector.grace_seconds = options["grace_seconds"]
+
+        total_files, total_bytes = collector.release_dead_letters()
+        # One full pass over the index, a batch at a time
+        while True:
+            files, reclaimed = collector.collect()
+            total_files += files
+            total_bytes += reclaimed
+            if collector.last_pk == 0:
+                break
+
+        log.info(f"Deleted {total_files} media files, reclaimed {total_bytes} bytes.")
@@ -1,26 +1,87 @@
+import time
 import signal
+from contextlib import nullcontext
+from core import settings
 from core.logger import log
 from threading import Thread, Event
 from django.core.management.base import BaseCommand
-from integrations.post_management import post_scheduled_posts
+from django.utils import timezone
+from integrations.post_management import (
+    post_scheduled_posts,
+    idle_poster_loop,
+    get_poster_loop,
+    close_poster_loop,
+)
+from integrations.prewarm import prewarm_platforms
+from integrations.scheduler import DueScheduler
+from integrations.media import MediaCollector
+from integrations.permalinks import PermalinkBackfill
+from integrations.metrics import metrics, write_metrics_file, start_metrics_server
+from integrations.profiling import TickProfiler
+from integrations.platforms.refresh_tokens import TokenRefresher
 
 stop_event = Event()
 
 
-def runner():
+def runner(profiler: TickProfiler = None):
+    scheduler = DueScheduler()
+    media_collector = MediaCollector()
+    permalink_backfill = PermalinkBackfill()
+
     while not stop_event.is_set():
         try:
-            post_scheduled_posts()
-            # Sleep up to 5 seconds or exit early if stop_event is set
-            stop_event.wait(5)
+            # Sleep until the next post is due, a post changed or a re-sync is needed
+            if not scheduler.wait_for_due(stop_event, idle_poster_loop):
+                break
+
+            due = scheduler.pop_due()
+            if due and all(kind == "prewarm" for kind, _ in due):
+                # A burst is a few seconds away, connect now instead of during it
+                prewarm_platforms(get_poster_loop(), timezone.now())
+                continue
+            if due:
+                log.debug(f"Scheduler woke up for {len(due)} due deliveries.")
+
+            started = time.perf_counter()
+            with profiler.tick() if profiler else nullcontext():
+                post_scheduled_posts(stop_event)
+            metrics.observe("poster_tick_seconds", time.perf_counter() - started)
+            scheduler.sync()
+
+            if media_collector.is_due():
+                media_collector.release_dead_letters()
+                media_collector.collect()
+            if permalink_backfill.is_due():
+                permalink_backfill.backfill(get_poster_loop())
         except Exception as err:
             log.exception(err)
+            metrics.inc("poster_tick_errors_total")
+            stop_event.wait(5)
             continue
+        finally:
+            write_metrics_file()
+
+    close_poster_loop()
+    if profiler:
+        profiler.stop()
 
 
 class Command(BaseCommand):
     help = "Run Poster."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="Profile sampled ticks and snapshot memory into logs/profiles.",
+        )
+        parser.add_argument(
+            "--profile-every",
+            type=int,
+            default=settings.POSTER_PROFILE_SAMPLE_EVERY,
+            help="Run one tick in this many under cProfile.",
+        )
+
     def handle(self, *args, **options):
         def handle_signal(signum, frame):
             log.info(f"Received termination signal ({signum}), shutting down...")
@@ -30,7 +91,20 @@ class Command(BaseCommand):
         signal.signal(signal.SIGTERM, handle_signal)
         signal.signal(signal.SIGINT, handle_signal)
 
-        poster = Thread(target=runner)
+        metrics_server = None
+        if settings.POSTER_METRICS_PORT:
+            metrics_server = start_metrics_server()
+
+        profiler = None
+        if options["profile"]:
+            profiler = TickProfiler(sample_every=options["profile_every"])
+            profiler.start()
+
+        # Token refresh runs on its own schedule so slow refreshes never delay posts
+        refresher = Thread(target=TokenRefresher().run, args=(stop_event,))
+        refresher.start()
+
+        poster = Thread(target=runner, args=(profiler,))
         log.info("Poster started!")
         poster.start()
 
@@ -42,4 +116,7 @@ class Command(BaseCommand):
         finally:
             stop_event.set()
             poster.join()
+            refresher.join()
+            if metrics_server:
+                metrics_server.shutdown()
             log.info("Poster stopped cleanly.")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from integrations.simulator import SimulatorConfig, make_simulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local simulation of the X, Graph and LinkedIn APIs. "
+        "Point the posters at it with PLATFORM_API_SIMULATOR_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8900)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Seconds every response is delayed by.",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.05,
+            help="Random extra delay of up to this many seconds.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests answered with a 5xx error.",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=int,
+            default=0,
+            help="Requests per token in each window before answering 429.",
+        )
+        parser.add_argument(
+            "--rate-limit-window",
+            type=float,
+            default=900,
+            help="Length of the rate limit window in seconds.",
+        )
+
+    def handle(self, *args, **options):
+        config = SimulatorConfig(
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            rate_limit=options["rate_limit"],
+            rate_limit_window=options["rate_limit_window"],
+        )
+        server, _ = make_simulator(options["host"], options["port"], config)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
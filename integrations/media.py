@@ -0,0 +1,172 @@
+import os
+import time
+from datetime import timedelta
+from core import settings
+from core.logger import log
+from django.db.models import Q
+from django.utils import timezone
+from django.core.files.storage import default_storage
+from socialsched.models import PostModel, MediaFile
+from .models import PostDelivery, DeliveryState
+from .metrics import metrics
+
+
+def delete_media_files(names: list[str]):
+    """
+    Remove files from storage and from the media index.
+    Returns (deleted files, reclaimed bytes).
+    """
+    deleted = []
+    reclaimed = 0
+    for name in names:
+        try:
+            size = default_storage.size(name)
+            default_storage.delete(name)
+        except FileNotFoundError:
+            size = 0
+        except OSError as err:
+            log.warning(f"Could not delete media {name}: {err}")
+            continue
+        deleted.append(name)
+        reclaimed += size
+
+    MediaFile.objects.filter(name__in=deleted).delete()
+    metrics.inc("poster_media_deleted_files_total", len(deleted))
+    metrics.inc("poster_media_reclaimed_bytes_total", reclaimed)
+    return len(deleted), reclaimed
+
+
+def get_dead_letter_expiry():
+    return timezone.now() - timedelta(seconds=settings.POSTER_DEAD_LETTER_MEDIA_SECONDS)
+
+
+def release_post_media(post_ids: list[int]):
+    """
+    Delete the media of posts once every delivery that uploads it is done.
+    Failed deliveries keep their media for POSTER_DEAD_LETTER_MEDIA_SECONDS,
+    their dead letters can still be replayed until then.
+    """
+    done = Q(state=DeliveryState.PUBLISHED) | Q(
+        state=DeliveryState.FAILED, updated_at__lte=get_dead_letter_expiry()
+    )
+    still_needed = (
+        PostDelivery.objects.filter(post_id__in=post_ids)
+        .exclude(done)
+        .values("post_id")
+    )
+    released = list(
+        PostModel.objects.filter(id__in=post_ids)
+        .exclude(id__in=still_needed)
+        .exclude(media_file__isnull=True)
+        .exclude(media_file="")
+        .values_list("id", "media_file")
+    )
+    if not released:
+        return 0, 0
+
+    PostModel.objects.filter(id__in=[post_id for post_id, _ in released]).update(
+        media_file=None
+    )
+
+    names = list({name for _, name in released})
+    # Another post can still point at the same file
+    shared = set(
+        PostModel.objects.filter(media_file__in=names).values_list(
+            "media_file", flat=True
+        )
+    )
+    files, reclaimed = delete_media_files([n for n in names if n not in shared])
+    log.debug(f"Released media of {len(released)} posts, reclaimed {reclaimed} bytes.")
+    return files, reclaimed
+
+
+def index_media_root():
+    """
+    Add files already in MEDIA_ROOT to the media index.
+    Only needed once for files uploaded before the index existed.
+    """
+    indexed = set(MediaFile.objects.values_list("name", flat=True))
+    media_files = []
+    with os.scandir(settings.MEDIA_ROOT) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name not in indexed:
+                media_files.append(
+                    MediaFile(name=entry.name, size=entry.stat().st_size)
+                )
+
+    MediaFile.objects.bulk_create(
+        media_files, batch_size=settings.POSTER_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(media_files)
+
+
+class MediaCollector:
+    """
+    Deletes indexed media files that no post references anymore.
+    django_cleanup already removes files on instance delete and replace,
+    this catches what it misses: queryset deletes, interrupted uploads
+    and files left from before the index existed.
+
+    Each run checks one batch of the index and remembers where it stopped,
+    so a full pass is spread over several runs.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = settings.POSTER_MEDIA_GC_SECONDS,
+        batch_size: int = settings.POSTER_MEDIA_GC_BATCH_SIZE,
+        grace_seconds: float = settings.POSTER_MEDIA_GC_GRACE_SECONDS,
+    ):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.grace_seconds = grace_seconds
+        self.last_pk = 0
+        self.last_run = 0.0
+
+    def is_due(self):
+        return time.monotonic() - self.last_run >= self.interval_seconds
+
+    def release_dead_letters(self):
+        """Release the media of posts whose dead letters are past retention."""
+        post_ids = list(
+            PostDelivery.objects.filter(
+                state=DeliveryState.FAILED, updated_at__lte=get_dead_letter_expiry()
+            )
+            .exclude(post__media_file__isnull=True)
+            .exclude(post__media_file="")
+            .order_by("updated_at")
+            .values_list("post_id", flat=True)
+            .distinct()[: self.batch_size]
+        )
+        if not post_ids:
+            return 0, 0
+        return release_post_media(post_ids)
+
+    def collect(self):
+        self.last_run = time.monotonic()
+        # Fresh files may belong to a post that is still being saved
+        created_before = timezone.now() - timedelta(seconds=self.grace_seconds)
+        batch = list(
+            MediaFile.objects.filter(
+                pk__gt=self.last_pk, created_at__lte=created_before
+            )
+            .order_by("pk")
+            .values_list("pk", "name")[: self.batch_size]
+        )
+        if not batch:
+            self.last_pk = 0
+            return 0, 0
+
+        self.last_pk = batch[-1][0]
+        names = [name for _, name in batch]
+        referenced = set(
+            PostModel.objects.filter(media_file__in=names).values_list(
+                "media_file", flat=True
+            )
+        )
+        files, reclaimed = delete_media_files(
+            [name for name in names if name not in referenced]
+        )
+        if files:
+            log.info(f"Media collector deleted {files} files, reclaimed {reclaimed} bytes.")
+        return files, reclaimed
@@ -0,0 +1,130 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core import settings
+from core.logger import log
+
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+
+def format_labels(labels: tuple):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+@dataclass
+class Histogram:
+    buckets: tuple
+    counts: list = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        self.counts = [0] * len(self.buckets)
+
+    def observe(self, value: float):
+        self.total += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms for the poster,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: dict[tuple, float] = {}
+        self.gauges: dict[tuple, float] = {}
+        self.histograms: dict[tuple, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in typed:
+                        lines.append(f"# TYPE {name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+
+            typed = set()
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    bucket_labels = labels + (("le", bound),)
+                    lines.append(f"{name}_bucket{format_labels(bucket_labels)} {count}")
+                inf_labels = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{format_labels(inf_labels)} {histogram.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.total}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def write_metrics_file(path=settings.POSTER_METRICS_FILE):
+    # Write then rename so a scraper never reads a half written file
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        tmp_path.write_text(metrics.render())
+        os.replace(tmp_path, path)
+    except OSError as err:
+        log.warning(f"Could not write metrics file: {err}")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(
+    host: str = settings.POSTER_METRICS_HOST, port: int = settings.POSTER_METRICS_PORT
+):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"Serving poster metrics on http://{host}:{port}/metrics")
+    return server
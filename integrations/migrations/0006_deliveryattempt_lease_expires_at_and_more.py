@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0005_deadletter_deliveryattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryattempt',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryattempt',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,152 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+PLATFORM_COLUMNS = [
+    ("X", "post_on_x", "link_x"),
+    ("LinkedIn", "post_on_linkedin", "link_linkedin"),
+    ("Facebook", "post_on_facebook", "link_facebook"),
+    ("Instagram", "post_on_instagram", "link_instagram"),
+]
+
+PLATFORM_FIELDS = [
+    field for _, selected, link in PLATFORM_COLUMNS for field in (selected, link)
+]
+
+
+def backfill_deliveries(apps, schema_editor):
+    PostModel = apps.get_model("socialsched", "PostModel")
+    PostDelivery = apps.get_model("integrations", "PostDelivery")
+    DeadLetter = apps.get_model("integrations", "DeadLetter")
+    now = django.utils.timezone.now()
+
+    # Queued retries keep their row, in-flight leases are dropped
+    PostDelivery.objects.update(lease_owner=None, lease_expires_at=None)
+
+    PostDelivery.objects.bulk_create(
+        [
+            PostDelivery(
+                post_id=dead_letter.post_id,
+                platform=dead_letter.platform,
+                state="failed",
+                attempts=dead_letter.attempts,
+                due_at=dead_letter.created_at,
+                error=dead_letter.error,
+            )
+            for dead_letter in DeadLetter.objects.all()
+        ],
+        ignore_conflicts=True,
+    )
+
+    last_pk = 0
+    while True:
+        batch = list(
+            PostModel.objects.filter(pk__gt=last_pk)
+            .only("id", "posted", "due_at_utc", *PLATFORM_FIELDS)
+            .order_by("pk")[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        deliveries = []
+        for post in batch:
+            for platform, selected, link in PLATFORM_COLUMNS:
+                post_url = getattr(post, link)
+                if post_url:
+                    deliveries.append(
+                        PostDelivery(
+                            post_id=post.id,
+                            platform=platform,
+                            state="published",
+                            attempts=1,
+                            due_at=post.due_at_utc or now,
+                            result_url=post_url,
+                            published_at=post.due_at_utc or now,
+                        )
+                    )
+                elif getattr(post, selected) and not post.posted:
+                    deliveries.append(
+                        PostDelivery(
+                            post_id=post.id,
+                            platform=platform,
+                            due_at=post.due_at_utc or now,
+                        )
+                    )
+
+        PostDelivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0006_deliveryattempt_lease_expires_at_and_more'),
+        ('socialsched', '0002_postmodel_due_at_utc_postmodel_post_due_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='deliveryattempt',
+            name='unique_delivery_attempt',
+        ),
+        migrations.RenameModel(
+            old_name='DeliveryAttempt',
+            new_name='PostDelivery',
+        ),
+        migrations.AlterModelOptions(
+            name='postdelivery',
+            options={'verbose_name_plural': 'post deliveries'},
+        ),
+        migrations.RenameField(
+            model_name='postdelivery',
+            old_name='next_attempt_at',
+            new_name='due_at',
+        ),
+        migrations.AlterField(
+            model_name='postdelivery',
+            name='due_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.RenameField(
+            model_name='postdelivery',
+            old_name='last_error',
+            new_name='error',
+        ),
+        migrations.AlterField(
+            model_name='postdelivery',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='socialsched.postmodel'),
+        ),
+        migrations.AddField(
+            model_name='postdelivery',
+            name='state',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('published', 'Published'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='postdelivery',
+            name='result_url',
+            field=models.CharField(blank=True, max_length=50000, null=True),
+        ),
+        migrations.AddField(
+            model_name='postdelivery',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='postdelivery',
+            name='published_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='postdelivery',
+            index=models.Index(fields=['state', 'due_at'], name='delivery_state_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postdelivery',
+            constraint=models.UniqueConstraint(fields=('post', 'platform'), name='unique_post_delivery'),
+        ),
+        migrations.RunPython(backfill_deliveries, migrations.RunPython.noop),
+    ]
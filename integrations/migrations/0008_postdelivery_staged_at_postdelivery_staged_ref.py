@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0007_postdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postdelivery',
+            name='staged_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='postdelivery',
+            name='staged_ref',
+            field=models.CharField(blank=True, max_length=1000, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 11:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0008_postdelivery_staged_at_postdelivery_staged_ref'),
+        ('socialsched', '0003_mediafile_postmodel_post_media_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('platform', models.CharField(choices=[('X', 'X'), ('LinkedIn', 'LinkedIn'), ('Facebook', 'Facebook'), ('Instagram', 'Instagram')], max_length=1000)),
+                ('state', models.CharField(choices=[('started', 'Started'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=255, null=True)),
+                ('result_url', models.CharField(blank=True, max_length=50000, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='socialsched.postmodel')),
+            ],
+            options={
+                'verbose_name_plural': 'publish ledger',
+            },
+        ),
+    ]
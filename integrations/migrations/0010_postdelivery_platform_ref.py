@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0009_publishledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postdelivery',
+            name='platform_ref',
+            field=models.CharField(blank=True, max_length=1000, null=True),
+        ),
+    ]
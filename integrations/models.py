@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from core import settings
 from django.utils.translation import gettext_lazy as _
-from integrations.aes import AESCBC
+from integrations.aes import DecryptedCache, get_cipher
 
 
 class Platform(models.TextChoices):
@@ -11,6 +12,12 @@ class Platform(models.TextChoices):
     INSTAGRAM = "Instagram", _("Instagram")
 
 
+TOKEN_FIELDS = ["access_token", "refresh_token"]
+
+# Keyed by (integration id, field), cleared when the integration is saved
+token_cache = DecryptedCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_SECONDS)
+
+
 class IntegrationsModel(models.Model):
     account_id = models.IntegerField()
     user_id = models.CharField(max_length=5000, null=True, blank=True)
@@ -21,7 +28,7 @@ class IntegrationsModel(models.Model):
     platform = models.CharField(max_length=1000, choices=Platform)
 
     def save(self, *args, **kwargs):
-        aes_cbc = AESCBC(settings.SECRET_KEY)
+        aes_cbc = get_cipher(settings.SECRET_KEY)
 
         if self.access_token:
             self.access_token = aes_cbc.encrypt(self.access_token)
@@ -30,15 +37,39 @@ class IntegrationsModel(models.Model):
 
         super().save(*args, **kwargs)
 
+    def get_token_value(self, field: str):
+        encrypted_text = getattr(self, field)
+        if not encrypted_text:
+            return None
+        value = token_cache.get_value((self.pk, field), encrypted_text)
+        if value is None:
+            value = get_cipher(settings.SECRET_KEY).decrypt(encrypted_text)
+            token_cache.set_values([((self.pk, field), encrypted_text, value)])
+        return value
+
     @property
     def access_token_value(self):
-        aes_cbc = AESCBC(settings.SECRET_KEY)
-        return aes_cbc.decrypt(self.access_token) if self.access_token else None
+        return self.get_token_value("access_token")
 
     @property
     def refresh_token_value(self):
-        aes_cbc = AESCBC(settings.SECRET_KEY)
-        return aes_cbc.decrypt(self.refresh_token) if self.refresh_token else None
+        return self.get_token_value("refresh_token")
+
+    @staticmethod
+    def decrypt_tokens(integrations: list["IntegrationsModel"]):
+        """Decrypt the tokens of a batch of integrations into the token cache."""
+        aes_cbc = get_cipher(settings.SECRET_KEY)
+        decrypted = []
+        for integration in integrations:
+            for field in TOKEN_FIELDS:
+                encrypted_text = getattr(integration, field)
+                key = (integration.pk, field)
+                if not encrypted_text:
+                    continue
+                if token_cache.get_value(key, encrypted_text) is None:
+                    value = aes_cbc.decrypt(encrypted_text)
+                    decrypted.append((key, encrypted_text, value))
+        token_cache.set_values(decrypted)
 
     class Meta:
         app_label = "integrations"
@@ -46,3 +77,138 @@ class IntegrationsModel(models.Model):
 
     def __str__(self):
         return f"AccountId:{self.account_id} Platform: {self.platform}"
+
+
+class DeliveryState(models.TextChoices):
+    PENDING = "pending", _("Pending")
+    SENDING = "sending", _("Sending")
+    PUBLISHED = "published", _("Published")
+    FAILED = "failed", _("Failed")
+
+
+# Deliveries the poster still has to finish
+OPEN_DELIVERY_STATES = [DeliveryState.PENDING, DeliveryState.SENDING]
+
+
+class PostDelivery(models.Model):
+    post = models.ForeignKey(
+        "socialsched.PostModel",
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+    )
+    platform = models.CharField(max_length=1000, choices=Platform)
+    state = models.CharField(
+        max_length=20, choices=DeliveryState, default=DeliveryState.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    due_at = models.DateTimeField()
+    result_url = models.CharField(max_length=50000, null=True, blank=True)
+    # Id of the published post while its public link is not known yet
+    platform_ref = models.CharField(max_length=1000, null=True, blank=True)
+    # Media id, asset urn or container id uploaded ahead of the due time
+    staged_ref = models.CharField(max_length=1000, null=True, blank=True)
+    staged_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    lease_owner = models.CharField(max_length=255, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = "integrations"
+        verbose_name_plural = "post deliveries"
+        indexes = [
+            models.Index(fields=["state", "due_at"], name="delivery_state_due_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "platform"], name="unique_post_delivery"
+            ),
+        ]
+
+    def __str__(self):
+        return f"PostId:{self.post_id} Platform: {self.platform} State: {self.state}"
+
+
+class LedgerState(models.TextChoices):
+    STARTED = "started", _("Started")
+    SUCCEEDED = "succeeded", _("Succeeded")
+    FAILED = "failed", _("Failed")
+
+
+def get_ledger_key(post_id: int, platform: str):
+    return f"{post_id}:{platform}"
+
+
+class PublishLedger(models.Model):
+    """
+    What happened to the last platform call of each (post, platform).
+    A started entry without an outcome means the worker stopped mid-call
+    and the post may or may not be live on the platform.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    post = models.ForeignKey(
+        "socialsched.PostModel",
+        on_delete=models.CASCADE,
+        related_name="ledger_entries",
+    )
+    platform = models.CharField(max_length=1000, choices=Platform)
+    state = models.CharField(max_length=20, choices=LedgerState)
+    worker = models.CharField(max_length=255, null=True, blank=True)
+    result_url = models.CharField(max_length=50000, null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = "integrations"
+        verbose_name_plural = "publish ledger"
+
+    def __str__(self):
+        return f"{self.key} State: {self.state}"
+
+
+class DeadLetter(models.Model):
+    post = models.ForeignKey(
+        "socialsched.PostModel",
+        on_delete=models.CASCADE,
+        related_name="dead_letters",
+    )
+    platform = models.CharField(max_length=1000, choices=Platform)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def replay(self):
+        with transaction.atomic():
+            now = timezone.now()
+            PostDelivery.objects.update_or_create(
+                post_id=self.post_id,
+                platform=self.platform,
+                defaults={
+                    "state": DeliveryState.PENDING,
+                    "attempts": 0,
+                    "due_at": now,
+                    "error": None,
+                    "lease_owner": None,
+                    "lease_expires_at": None,
+                    # Containers and media ids expire, the replay uploads again
+                    "staged_ref": None,
+                    "staged_at": None,
+                    "updated_at": now,
+                },
+            )
+            # A replay is a decision to call the platform again, unless it worked
+            PublishLedger.objects.filter(
+                key=get_ledger_key(self.post_id, self.platform)
+            ).exclude(state=LedgerState.SUCCEEDED).delete()
+            self.delete()
+
+    class Meta:
+        app_label = "integrations"
+        verbose_name_plural = "dead letters"
+
+    def __str__(self):
+        return f"PostId:{self.post_id} Platform: {self.platform} Error: {self.error}"
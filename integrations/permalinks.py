@@ -0,0 +1,141 @@
+import time
+import asyncio
+from datetime import timedelta
+from core import settings
+from core.logger import log
+from django.db import transaction
+from django.utils import timezone
+from socialsched.models import PostModel
+from socialsched.rollup import record_post_links
+from .models import (
+    IntegrationsModel,
+    Platform,
+    PostDelivery,
+    DeliveryState,
+    PublishLedger,
+    get_ledger_key,
+)
+from .repository import integration_repository
+from .metrics import metrics
+from .post_management import LINK_FIELDS
+from .platforms.instagram import get_instagram_permalink
+
+
+PERMALINK_READERS = {
+    Platform.INSTAGRAM.value: get_instagram_permalink,
+}
+
+PERMALINK_FIELDS = [
+    "id",
+    "platform",
+    "platform_ref",
+    "post__id",
+    "post__account_id",
+]
+
+
+async def read_permalink(delivery: PostDelivery, integration: IntegrationsModel):
+    if integration is None:
+        return None
+    try:
+        return await PERMALINK_READERS[delivery.platform](
+            integration, delivery.platform_ref
+        )
+    except Exception as err:
+        log.warning(
+            f"{delivery.platform} permalink of {delivery.platform_ref} "
+            f"still not available: {err}"
+        )
+        return None
+
+
+class PermalinkBackfill:
+    """
+    Fills the link columns of posts that went live while the platform could
+    not return their permalink. Only the platform id was stored at publish
+    time, the link is read again on every run until it shows up or the
+    delivery is older than max_age_seconds.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = settings.POSTER_PERMALINK_SECONDS,
+        batch_size: int = settings.POSTER_PERMALINK_BATCH_SIZE,
+        max_age_seconds: float = settings.POSTER_PERMALINK_MAX_AGE_SECONDS,
+    ):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_age_seconds = max_age_seconds
+        self.last_run = 0.0
+
+    def is_due(self):
+        return time.monotonic() - self.last_run >= self.interval_seconds
+
+    def get_pending(self):
+        published_after = timezone.now() - timedelta(seconds=self.max_age_seconds)
+        return list(
+            PostDelivery.objects.filter(
+                state=DeliveryState.PUBLISHED,
+                platform__in=list(PERMALINK_READERS),
+                platform_ref__isnull=False,
+                result_url__isnull=True,
+                published_at__gte=published_after,
+            )
+            .select_related("post")
+            .only(*PERMALINK_FIELDS)
+            .order_by("published_at")[: self.batch_size]
+        )
+
+    def backfill(self, loop: asyncio.AbstractEventLoop):
+        self.last_run = time.monotonic()
+        deliveries = self.get_pending()
+        if not deliveries:
+            return 0
+
+        integrations = integration_repository.get_many(
+            (delivery.post.account_id, delivery.platform) for delivery in deliveries
+        )
+        urls = loop.run_until_complete(
+            asyncio.gather(
+                *[
+                    read_permalink(
+                        delivery,
+                        integrations[(delivery.post.account_id, delivery.platform)],
+                    )
+                    for delivery in deliveries
+                ]
+            )
+        )
+        found = [(delivery, url) for delivery, url in zip(deliveries, urls) if url]
+        if not found:
+            return 0
+
+        self.write_links(found)
+        metrics.inc("poster_permalinks_backfilled_total", len(found))
+        log.info(f"Backfilled {len(found)} permalinks.")
+        return len(found)
+
+    def write_links(self, found: list[tuple[PostDelivery, str]]):
+        post_links = {}
+        for delivery, url in found:
+            delivery.result_url = url
+            post_links.setdefault(delivery.post_id, {})[
+                LINK_FIELDS[delivery.platform]
+            ] = url
+
+        with transaction.atomic():
+            PostDelivery.objects.bulk_update(
+                [delivery for delivery, _ in found],
+                ["result_url"],
+                batch_size=settings.POSTER_BATCH_SIZE,
+            )
+            # Published posts move from scheduled to published in the calendar rollup
+            record_post_links(post_links)
+            for delivery, url in found:
+                link_field = LINK_FIELDS[delivery.platform]
+                PostModel.objects.filter(id=delivery.post_id).update(
+                    **{link_field: url}
+                )
+                PublishLedger.objects.filter(
+                    key=get_ledger_key(delivery.post_id, delivery.platform)
+                ).update(result_url=url)
@@ -1,3 +1,13 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class PendingPermalink:
+    """A post that is live on the platform, its public link is read later."""
+
+    post_id: str
+
+
 class ErrorAccessTokenNotProvided(Exception):
     def __str__(self):
         return "Access token not found."
@@ -26,3 +36,43 @@ class ErrorAccessTokenOrUserIdNotFound(Exception):
 class ErrorThisTypeOfPostIsNotSupported(Exception):
     def __str__(self):
         return "This type of posts is not supported."
+
+
+class ErrorMediaNotReady(Exception):
+    def __init__(self, media_id: str):
+        self.media_id = media_id
+
+    def __str__(self):
+        return f"Media {self.media_id} is still processing."
+
+
+class ErrorOutcomeUnknown(Exception):
+    """The request reached the platform but its answer was lost."""
+
+    def __init__(self, platform: str, reason: str):
+        self.platform = platform
+        self.reason = reason
+
+    def __str__(self):
+        return f"{self.platform} request may have run: {self.reason}"
+
+
+class ErrorRateLimited(Exception):
+    def __init__(self, platform: str, retry_after: float = None):
+        self.platform = platform
+        self.retry_after = retry_after
+
+    def __str__(self):
+        if self.retry_after is None:
+            return f"Rate limit reached on {self.platform}."
+        return f"Rate limit reached on {self.platform}, retry in {self.retry_after:.0f}s."
+
+
+class ErrorRateLimitWait(ErrorRateLimited):
+    """Our own bucket has no token for longer than POSTER_RATE_LIMIT_MAX_WAIT."""
+
+    def __str__(self):
+        return (
+            f"Rate limit budget of {self.platform} used up, "
+            f"queued for {self.retry_after:.0f}s."
+        )
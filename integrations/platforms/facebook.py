@@ -1,10 +1,11 @@
 import re
-import requests
-from core.logger import log, send_notification
-from asgiref.sync import sync_to_async
+from core import settings
+from core.logger import log
 from dataclasses import dataclass
-from integrations.models import IntegrationsModel
-from socialsched.models import PostModel
+from integrations.models import IntegrationsModel, Platform
+from integrations.metrics import metrics
+from .transport import PlatformClient
+from .graphbatch import GraphBatchWriter
 from .common import (
     ErrorAccessTokenNotProvided,
     ErrorPageIdNotProvided,
@@ -12,6 +13,10 @@ from .common import (
 )
 
 
+# Page posts due together share Graph batch requests
+facebook_batch = GraphBatchWriter(Platform.FACEBOOK.value)
+
+
 @dataclass
 class FacebookPoster:
     integration: IntegrationsModel
@@ -27,88 +32,91 @@ class FacebookPoster:
         if not self.page_id:
             raise ErrorPageIdNotProvided
 
-        self.base_url = f"https://graph.facebook.com/{self.api_version}/{self.page_id}"
-        self.feed_url = self.base_url + "/feed"
-        self.photos_url = self.base_url + "/photos"
+        self.base_url = f"{settings.GRAPH_API_URL}/{self.api_version}/{self.page_id}"
+        self.client = PlatformClient(
+            Platform.FACEBOOK.value, self.integration.account_id
+        )
 
     def get_post_url(self, post_id: int):
         return f"https://www.facebook.com/{self.page_id}/posts/{post_id}"
 
-    def post_text(self, text: str):
+    async def publish(self, edge: str, payload: dict):
+        if settings.GRAPH_BATCH_REQUESTS:
+            return await facebook_batch.post(self, f"{self.page_id}/{edge}", payload)
+
+        response = await self.client.post(
+            f"{self.base_url}/{edge}",
+            json={**payload, "access_token": self.access_token},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def post_text(self, text: str):
         payload = {
             "message": text,
             "published": True,
-            "access_token": self.access_token,
         }
-        response = requests.post(self.feed_url, json=payload)
-        response.raise_for_status()
-        return self.get_post_url(response.json()["id"])
+        response = await self.publish("feed", payload)
+        return self.get_post_url(response["id"])
 
-    def post_text_with_link(self, text: str, link: str):
+    async def post_text_with_link(self, text: str, link: str):
         payload = {
             "message": text,
             "link": link,
             "published": True,
-            "access_token": self.access_token,
         }
-        response = requests.post(self.feed_url, json=payload)
-        response.raise_for_status()
-        return self.get_post_url(response.json()["id"])
+        response = await self.publish("feed", payload)
+        return self.get_post_url(response["id"])
 
-    def post_text_with_image(self, text: str, image_url: str):
+    async def post_text_with_image(self, text: str, image_url: str):
         payload = {
             "message": text,
             "url": image_url,
-            "access_token": self.access_token,
         }
-        response = requests.post(self.photos_url, json=payload)
-        log.debug(response.json())
-        response.raise_for_status()
+        response = await self.publish("photos", payload)
+        log.debug(response)
 
-        return self.get_post_url(response.json()["post_id"])
+        return self.get_post_url(response["post_id"])
 
-    def make_post(self, text: str, media_url: str = None):
+    async def make_post(self, text: str, media_url: str = None):
         if media_url is None:
             pattern = r"(https?://[^\s]+)$"
             match = re.search(pattern, text)
             if match:
                 link = match.group(1)
-                return self.post_text_with_link(text, link)
-            return self.post_text(text)
+                return await self.post_text_with_link(text, link)
+            return await self.post_text(text)
 
         if media_url.endswith((".jpg", ".jpeg", ".png")):
-            return self.post_text_with_image(text, media_url)
+            return await self.post_text_with_image(text, media_url)
 
         raise ErrorThisTypeOfPostIsNotSupported
 
 
-@sync_to_async
-def update_facebook_link(post_id: int, post_url: str):
-    post = PostModel.objects.get(id=post_id)
-    post.link_facebook = post_url
-    post.post_on_facebook = False
-    post.save(skip_validation=True)
-
-
 async def post_on_facebook(
     integration: IntegrationsModel,
     post_id: int,
     post_text: str,
     media_url: str = None,
+    staged_ref: str = None,
 ):
+    poster = FacebookPoster(integration)
+    post_url = await poster.make_post(post_text, media_url)
+    metrics.observe(
+        "poster_delivery_rate_limit_wait_seconds",
+        poster.client.waited,
+        platform=Platform.FACEBOOK.value,
+    )
+    log.success(f"Facebook post url: {integration.account_id} {post_url}")
+
+    return post_url
 
-    post_url = None
-
-    try:
-        poster = FacebookPoster(integration)
-        post_url = poster.make_post(post_text, media_url)
-        log.success(f"Facebook post url: {integration.account_id} {post_url}")
-    except Exception as err:
-        log.error(f"Facebook post error: {integration.account_id} {err}")
-        log.exception(err)
-        send_notification(
-            "ImPosting", f"AccountId: {integration.account_id} got error {str(err)}"
-        )
-        await sync_to_async(integration.delete)()
 
-    await update_facebook_link(post_id, post_url)
+async def stage_on_facebook(
+    integration: IntegrationsModel,
+    post_text: str,
+    media_url: str = None,
+):
+    # Page posts are a single call, staging only checks the page token
+    FacebookPoster(integration)
+    return None
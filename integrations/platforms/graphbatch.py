@@ -0,0 +1,297 @@
+import json
+import time
+import asyncio
+import httpx
+from urllib.parse import urlencode
+from core import settings
+from core.logger import log
+from integrations.metrics import metrics
+from .transport import get_client, record_connection_use
+from .common import ErrorRateLimited, ErrorOutcomeUnknown
+from .ratelimit import rate_limiter, get_retry_after
+
+
+# Graph accepts up to 50 ids in one multi-id read and 50 requests in one batch
+GRAPH_MAX_IDS = 50
+GRAPH_MAX_BATCH = 50
+
+# Transport errors raised before the batch request was sent
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class GraphFieldsBatcher:
+    """
+    Coalesces reads of the same fields for many Graph ids.
+
+    Reads made under one access token within GRAPH_BATCH_WINDOW_SECONDS
+    go out as a single `?ids=a,b,c&fields=...` request.
+    """
+
+    def __init__(self, fields: str, endpoint: str = "default"):
+        self.fields = fields
+        self.endpoint = endpoint
+        # access token -> (poster, object id -> waiting futures)
+        self.pending: dict[str, tuple] = {}
+        self.tasks = set()
+
+    async def get(self, poster, object_id: str):
+        loop = asyncio.get_running_loop()
+        token = poster.access_token
+        batch = self.pending.get(token)
+        if batch is None:
+            batch = self.pending[token] = (poster, {})
+            loop.call_later(
+                settings.GRAPH_BATCH_WINDOW_SECONDS, self.flush, token, batch
+            )
+
+        future = loop.create_future()
+        batch[1].setdefault(object_id, []).append(future)
+        if len(batch[1]) >= GRAPH_MAX_IDS:
+            self.flush(token, batch)
+        return await future
+
+    def flush(self, token: str, batch: tuple):
+        if self.pending.get(token) is not batch:
+            return
+        del self.pending[token]
+        task = asyncio.get_running_loop().create_task(self.send(token, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send(self, token: str, batch: tuple):
+        poster, waiters = batch
+        try:
+            response = await poster.client.get(
+                f"{settings.GRAPH_API_URL}/{poster.api_version}/",
+                endpoint=self.endpoint,
+                params={
+                    "ids": ",".join(waiters),
+                    "fields": self.fields,
+                    "access_token": token,
+                },
+            )
+            response.raise_for_status()
+            data = response.json()
+        except Exception as err:
+            for futures in waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(err)
+            return
+
+        for object_id, futures in waiters.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if object_id in data:
+                    future.set_result(data[object_id])
+                else:
+                    future.set_exception(
+                        ValueError(f"Graph returned no {self.fields} for {object_id}")
+                    )
+
+
+def get_batch_access_token(items: list[dict]):
+    # Items carry their own page tokens, the app token only authorizes the batch
+    if settings.FACEBOOK_CLIENT_ID and settings.FACEBOOK_CLIENT_SECRET:
+        return f"{settings.FACEBOOK_CLIENT_ID}|{settings.FACEBOOK_CLIENT_SECRET}"
+    return items[0]["access_token"]
+
+
+def get_item_result(request: httpx.Request, item: dict, result: dict):
+    response = httpx.Response(
+        result["code"], content=result.get("body") or "", request=request
+    )
+    if response.is_error:
+        return httpx.HTTPStatusError(
+            f"Graph batch item {item['relative_url']} failed with {result['code']}.",
+            request=request,
+            response=response,
+        )
+    return response.json()
+
+
+class GraphBatchWriter:
+    """
+    Collects Graph POSTs made by concurrent deliveries into batch requests.
+
+    Each item keeps its own access token, rate limit bucket and result, so
+    one failed post does not fail the rest of its batch.
+    """
+
+    def __init__(self, platform: str, api_version: str = "v22.0"):
+        self.platform = platform
+        self.api_version = api_version
+        # [(batch item, future)] waiting for the next batch request
+        self.pending: list[tuple] = []
+        self.tasks = set()
+
+    async def post(
+        self, poster, relative_url: str, params: dict, endpoint: str = "default"
+    ):
+        waited = await rate_limiter.acquire(
+            self.platform, poster.integration.account_id, endpoint
+        )
+        poster.client.waited += waited
+        metrics.observe(
+            "poster_rate_limit_wait_seconds",
+            waited,
+            platform=self.platform,
+            endpoint=endpoint,
+        )
+
+        loop = asyncio.get_running_loop()
+        batch = self.pending
+        if not batch:
+            loop.call_later(settings.GRAPH_BATCH_WINDOW_SECONDS, self.flush, batch)
+
+        item = {
+            "relative_url": relative_url,
+            "body": {
+                # Graph wants lowercase booleans in form bodies
+                key: str(value).lower() if isinstance(value, bool) else value
+                for key, value in params.items()
+            },
+            "access_token": poster.access_token,
+            "account_id": poster.integration.account_id,
+            "endpoint": endpoint,
+        }
+        future = loop.create_future()
+        batch.append((item, future))
+        if len(batch) >= GRAPH_MAX_BATCH:
+            self.flush(batch)
+        return await future
+
+    def flush(self, batch: list[tuple]):
+        if batch is not self.pending:
+            return
+        self.pending = []
+        task = asyncio.get_running_loop().create_task(self.send(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send(self, batch: list[tuple]):
+        try:
+            await self.send_batch(batch)
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+
+    def update_rate_limits(self, items: list[dict], response: httpx.Response):
+        for account_id, endpoint in {
+            (item["account_id"], item["endpoint"]) for item in items
+        }:
+            rate_limiter.update_from_response(
+                self.platform, account_id, endpoint, response
+            )
+
+    async def send_batch(self, batch: list[tuple]):
+        items = [item for item, _ in batch]
+        client = get_client(self.platform)
+        started = time.perf_counter()
+        try:
+            response = await client.post(
+                f"{settings.GRAPH_API_URL}/{self.api_version}/",
+                data={
+                    "access_token": get_batch_access_token(items),
+                    "include_headers": "false",
+                    "batch": json.dumps(
+                        [
+                            {
+                                "method": "POST",
+                                "relative_url": item["relative_url"],
+                                "body": urlencode(
+                                    {
+                                        **item["body"],
+                                        "access_token": item["access_token"],
+                                    }
+                                ),
+                            }
+                            for item in items
+                        ]
+                    ),
+                },
+            )
+        except httpx.TransportError as err:
+            metrics.inc("poster_requests_total", platform=self.platform, status="error")
+            # Only a batch that never left can be sent again without publishing twice
+            if isinstance(err, NOT_SENT_ERRORS):
+                raise
+            raise ErrorOutcomeUnknown(
+                self.platform, f"batch request failed with {type(err).__name__}"
+            ) from err
+
+        record_connection_use(self.platform, response)
+        metrics.observe(
+            "poster_request_seconds",
+            time.perf_counter() - started,
+            platform=self.platform,
+            endpoint="batch",
+        )
+        metrics.inc(
+            "poster_requests_total",
+            platform=self.platform,
+            status=f"{response.status_code // 100}xx",
+        )
+        # Usage headers and 429 pauses apply to every account in the batch
+        self.update_rate_limits(items, response)
+
+        if response.status_code == 429:
+            raise ErrorRateLimited(
+                self.platform, get_retry_after(response.headers.get("retry-after"))
+            )
+        if response.status_code >= 500:
+            # Graph may have run some items already, none of them is retried
+            raise ErrorOutcomeUnknown(
+                self.platform, f"batch failed with {response.status_code}"
+            )
+        if response.is_error:
+            # The batch itself was rejected, nothing ran, send the items one by one
+            log.warning(
+                f"{self.platform} batch of {len(batch)} failed with "
+                f"{response.status_code}, sending the items separately."
+            )
+            await asyncio.gather(
+                *[self.send_one(item, future) for item, future in batch]
+            )
+            return
+
+        results = response.json()
+        for index, (item, future) in enumerate(batch):
+            if future.done():
+                continue
+            result = results[index] if index < len(results) else None
+            if result is None:
+                # Graph leaves items it did not finish in time empty, they may have run
+                outcome = ErrorOutcomeUnknown(
+                    self.platform, f"batch item {item['relative_url']} did not finish"
+                )
+            else:
+                try:
+                    outcome = get_item_result(response.request, item, result)
+                except ValueError as err:
+                    outcome = err
+            if isinstance(outcome, httpx.HTTPStatusError):
+                self.update_rate_limits([item], outcome.response)
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def send_one(self, item: dict, future: asyncio.Future):
+        try:
+            response = await get_client(self.platform).post(
+                f"{settings.GRAPH_API_URL}/{self.api_version}/{item['relative_url']}",
+                data={**item["body"], "access_token": item["access_token"]},
+            )
+            record_connection_use(self.platform, response)
+            self.update_rate_limits([item], response)
+            response.raise_for_status()
+            result = response.json()
+        except Exception as err:
+            if not future.done():
+                future.set_exception(err)
+            return
+        if not future.done():
+            future.set_result(result)
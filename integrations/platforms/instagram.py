@@ -1,16 +1,26 @@
-import requests
-from core.logger import log, send_notification
+import asyncio
+from core import settings
+from core.logger import log
 from dataclasses import dataclass
-from asgiref.sync import sync_to_async
-from integrations.models import IntegrationsModel
-from socialsched.models import PostModel
+from integrations.models import IntegrationsModel, Platform
+from integrations.metrics import metrics
+from .transport import PlatformClient
+from .graphbatch import GraphFieldsBatcher, GraphBatchWriter
 from .common import (
     ErrorAccessTokenNotProvided,
     ErrorPageIdNotProvided,
     ErrorThisTypeOfPostIsNotSupported,
+    ErrorMediaNotReady,
+    PendingPermalink,
 )
 
 
+# Container checks and permalinks of one account's posts share requests
+status_batcher = GraphFieldsBatcher("status_code")
+permalink_batcher = GraphFieldsBatcher("permalink")
+instagram_batch = GraphBatchWriter(Platform.INSTAGRAM.value)
+
+
 @dataclass
 class InstagramPoster:
     integration: IntegrationsModel
@@ -26,78 +36,130 @@ class InstagramPoster:
         if not self.page_id:
             raise ErrorPageIdNotProvided
 
-        self.base_url = f"https://graph.facebook.com/{self.api_version}/{self.page_id}"
+        self.base_url = f"{settings.GRAPH_API_URL}/{self.api_version}/{self.page_id}"
         self.media_url = self.base_url + "/media"
         self.media_publish_url = self.base_url + "/media_publish"
+        self.client = PlatformClient(
+            Platform.INSTAGRAM.value, self.integration.account_id
+        )
 
-    def get_post_url(self, post_id: int):
-        url = f"https://graph.facebook.com/{post_id}"
-        params = {
-            "fields": "permalink",
-            "access_token": self.access_token,
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()["permalink"]
-
-    def post_text_with_image(self, text: str, image_url: str):
+    async def get_post_url(self, post_id: int):
+        media = await permalink_batcher.get(self, post_id)
+        return media["permalink"]
+
+    async def get_published_url(self, media_id: str):
+        # The post is live once media_publish answered, a missing permalink
+        # must not send it back to the retry queue and publish it twice
+        try:
+            return await self.get_post_url(media_id)
+        except Exception as err:
+            log.warning(f"Instagram permalink of {media_id} not available: {err}")
+            return PendingPermalink(media_id)
+
+    async def wait_until_ready(self, creation_id: str):
+        for _ in range(settings.IG_CONTAINER_MAX_POLLS):
+            container = await status_batcher.get(self, creation_id)
+            status_code = container.get("status_code")
+            if status_code in (None, "FINISHED"):
+                return
+            if status_code in ("ERROR", "EXPIRED", "PUBLISHED"):
+                raise ValueError(f"Instagram container {creation_id} is {status_code}")
+            await asyncio.sleep(settings.IG_CONTAINER_POLL_SECONDS)
+        raise ErrorMediaNotReady(creation_id)
+
+    async def create_container(self, text: str, image_url: str):
         params = {
             "image_url": image_url,
             "is_carousel_item": False,
             "alt_text": text,
             "caption": text,
-            "access_token": self.access_token,
         }
-        container = requests.post(self.media_url, params=params)
+        if settings.GRAPH_BATCH_REQUESTS:
+            container = await instagram_batch.post(
+                self, f"{self.page_id}/media", params
+            )
+            return container["id"]
+
+        params["access_token"] = self.access_token
+        container = await self.client.post(self.media_url, params=params)
         container.raise_for_status()
-
-        publish = requests.post(
+        return container.json()["id"]
+
+    async def publish_container(self, creation_id: str):
+        if settings.GRAPH_BATCH_REQUESTS:
+            publish = await instagram_batch.post(
+                self,
+                f"{self.page_id}/media_publish",
+                {"creation_id": creation_id},
+                endpoint="publish",
+            )
+            return publish["id"]
+
+        publish = await self.client.post(
             self.media_publish_url,
+            endpoint="publish",
             headers={"Authorization": f"Bearer {self.access_token}"},
-            json={"creation_id": container.json()["id"]},
+            json={"creation_id": creation_id},
         )
         publish.raise_for_status()
+        return publish.json()["id"]
+
+    async def post_text_with_image(
+        self, text: str, image_url: str, creation_id: str = None
+    ):
+        if creation_id is None:
+            creation_id = await self.create_container(text, image_url)
+        await self.wait_until_ready(creation_id)
+        media_id = await self.publish_container(creation_id)
+        return await self.get_published_url(media_id)
+
+    async def stage(self, text: str, media_url: str = None):
+        if media_url is None:
+            return None
+        if media_url.endswith((".jpg", ".jpeg", ".png")):
+            return await self.create_container(text, media_url)
 
-        return self.get_post_url(publish.json()["id"])
+        raise ErrorThisTypeOfPostIsNotSupported
 
-    def make_post(self, text: str, media_url: str = None):
+    async def make_post(
+        self, text: str, media_url: str = None, staged_ref: str = None
+    ):
         if media_url is None:
             log.info("No media url for instagram post. Skip posting.")
             return
         if media_url.endswith((".jpg", ".jpeg", ".png")):
-            return self.post_text_with_image(text, media_url)
+            return await self.post_text_with_image(text, media_url, staged_ref)
 
         raise ErrorThisTypeOfPostIsNotSupported
 
 
-@sync_to_async
-def update_instagram_link(post_id: int, post_url: str):
-    post = PostModel.objects.get(id=post_id)
-    post.link_instagram = post_url
-    post.post_on_instagram = False
-    post.save(skip_validation=True)
-
-
 async def post_on_instagram(
     integration: IntegrationsModel,
     post_id: int,
     post_text: str,
     media_url: str = None,
+    staged_ref: str = None,
 ):
+    poster = InstagramPoster(integration)
+    post_url = await poster.make_post(post_text, media_url, staged_ref)
+    metrics.observe(
+        "poster_delivery_rate_limit_wait_seconds",
+        poster.client.waited,
+        platform=Platform.INSTAGRAM.value,
+    )
+    log.success(f"Instagram post url: {integration.account_id} {post_url}")
 
-    post_url = None
-
-    try:
-        poster = InstagramPoster(integration)
-        post_url = poster.make_post(post_text, media_url)
-        log.success(f"Instagram post url: {integration.account_id} {post_url}")
-    except Exception as err:
-        log.error(f"Instagram post error: {integration.account_id} {err}")
-        log.exception(err)
-        send_notification(
-            "ImPosting", f"AccountId: {integration.account_id} got error {str(err)}"
-        )
-        await sync_to_async(integration.delete)()
+    return post_url
+
+
+async def get_instagram_permalink(integration: IntegrationsModel, media_id: str):
+    return await InstagramPoster(integration).get_post_url(media_id)
 
 
-    await update_instagram_link(post_id, post_url)
+async def stage_on_instagram(
+    integration: IntegrationsModel,
+    post_text: str,
+    media_url: str = None,
+):
+    # Media containers can be published for 24 hours
+    return await InstagramPoster(integration).stage(post_text, media_url)
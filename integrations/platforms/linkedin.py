@@ -1,9 +1,11 @@
-import requests
-from core.logger import log, send_notification
+import asyncio
+from pathlib import Path
+from core import settings
+from core.logger import log
 from dataclasses import dataclass
-from integrations.models import IntegrationsModel
-from socialsched.models import PostModel
-from asgiref.sync import sync_to_async
+from integrations.models import IntegrationsModel, Platform
+from integrations.metrics import metrics
+from .transport import PlatformClient
 from .common import (
     ErrorAccessTokenNotProvided,
     ErrorUserIdNotProvided,
@@ -31,6 +33,10 @@ class LinkedinPoster:
             "Content-Type": "application/json",
             "X-Restli-Protocol-Version": "2.0.0",
         }
+        self.api_url = f"{settings.LINKEDIN_API_URL}/{self.api_version}"
+        self.client = PlatformClient(
+            Platform.LINKEDIN.value, self.integration.account_id
+        )
 
     def _get_basic_payload(self, post_text: str, share_media_category: str):
 
@@ -48,7 +54,7 @@ class LinkedinPoster:
 
         return payload
 
-    def _upload_media(self, filepath: str):
+    async def _upload_media(self, filepath: str):
 
         upload_payload = {
             "registerUploadRequest": {
@@ -63,35 +69,44 @@ class LinkedinPoster:
             }
         }
 
-        upload_response = requests.post(
-            url=f"https://api.linkedin.com/{self.api_version}/assets?action=registerUpload",
+        upload_response = await self.client.post(
+            url=f"{self.api_url}/assets?action=registerUpload",
             headers=self.headers,
             json=upload_payload,
         )
+        upload_response.raise_for_status()
         upload_data = upload_response.json()
         upload_url = upload_data["value"]["uploadMechanism"][
             "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"
         ]["uploadUrl"]
         asset = upload_data["value"]["asset"]
 
-        with open(filepath, "rb") as image_file:
-            requests.put(
-                upload_url,
-                headers={
-                    "Authorization": f"Bearer {self.access_token}",
-                    "Content-Type": "application/octet-stream",
-                },
-                data=image_file,
-            )
+        image_content = await asyncio.to_thread(Path(filepath).read_bytes)
+        put_response = await self.client.put(
+            upload_url,
+            headers={
+                "Authorization": f"Bearer {self.access_token}",
+                "Content-Type": "application/octet-stream",
+            },
+            content=image_content,
+        )
+        put_response.raise_for_status()
 
         return asset
 
-    def make_post(self, text: str, media_path: str = None):
+    async def stage(self, text: str, media_path: str = None):
+        if not media_path:
+            return None
+        return await self._upload_media(media_path)
+
+    async def make_post(
+        self, text: str, media_path: str = None, staged_ref: str = None
+    ):
         share_media_category = "IMAGE" if media_path else "NONE"
         payload = self._get_basic_payload(text, share_media_category)
 
         if share_media_category == "IMAGE":
-            asset = self._upload_media(media_path)
+            asset = staged_ref or await self._upload_media(media_path)
             payload["specificContent"]["com.linkedin.ugc.ShareContent"]["media"] = [
                 {
                     "status": "READY",
@@ -101,42 +116,39 @@ class LinkedinPoster:
                 }
             ]
 
-        response = requests.post(
-            url=f"https://api.linkedin.com/{self.api_version}/ugcPosts",
+        response = await self.client.post(
+            url=f"{self.api_url}/ugcPosts",
+            endpoint="posts",
             headers=self.headers,
             json=payload,
         )
+        response.raise_for_status()
 
         return f"https://www.linkedin.com/feed/update/{response.json()['id']}"
 
 
-@sync_to_async
-def update_linkedin_link(post_id: int, post_url: str):
-    post = PostModel.objects.get(id=post_id)
-    post.link_linkedin = post_url
-    post.post_on_linkedin = False
-    post.save(skip_validation=True)
-
-
 async def post_on_linkedin(
     integration: IntegrationsModel,
     post_id: int,
     post_text: str,
     media_path: str = None,
+    staged_ref: str = None,
 ):
+    poster = LinkedinPoster(integration)
+    post_url = await poster.make_post(post_text, media_path, staged_ref)
+    metrics.observe(
+        "poster_delivery_rate_limit_wait_seconds",
+        poster.client.waited,
+        platform=Platform.LINKEDIN.value,
+    )
+    log.success(f"Linkedin post url: {integration.account_id} {post_url}")
+
+    return post_url
 
-    post_url = None
-
-    try:
-        poster = LinkedinPoster(integration)
-        post_url = poster.make_post(post_text, media_path)
-        log.success(f"Linkedin post url: {integration.account_id} {post_url}")
-    except Exception as err:
-        log.error(f"Linkedin post error: {integration.account_id} {err}")
-        log.exception(err)
-        send_notification(
-            "ImPosting", f"AccountId: {integration.account_id} got error {str(err)}"
-        )
-        await sync_to_async(integration.delete)()
 
-    await update_linkedin_link(post_id, post_url)
+async def stage_on_linkedin(
+    integration: IntegrationsModel,
+    post_text: str,
+    media_path: str = None,
+):
+    return await LinkedinPoster(integration).stage(post_text, media_path)
@@ -0,0 +1,204 @@
+import json
+import time
+import asyncio
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from core import settings
+from core.logger import log
+from integrations.models import Platform
+from .common import ErrorRateLimitWait
+
+
+# "platform" or "platform:endpoint" -> scope -> (requests, period in seconds)
+# "app" buckets are shared by every account, "account" buckets are per integration
+# Endpoints share the platform bucket of every scope they do not set themselves
+DEFAULT_RATE_LIMITS = {
+    Platform.X_TWITTER.value: {"app": (10000, 86400), "account": (100, 900)},
+    f"{Platform.X_TWITTER.value}:media": {"account": (500, 900)},
+    Platform.FACEBOOK.value: {"account": (200, 3600)},
+    Platform.INSTAGRAM.value: {"account": (200, 3600)},
+    f"{Platform.INSTAGRAM.value}:publish": {"account": (50, 86400)},
+    Platform.LINKEDIN.value: {"app": (100000, 86400)},
+    f"{Platform.LINKEDIN.value}:posts": {"account": (150, 86400)},
+}
+
+
+@dataclass
+class TokenBucket:
+    capacity: float
+    refill_rate: float
+    tokens: float = None
+    updated_at: float = field(default_factory=time.monotonic)
+    paused_until: float = 0.0
+
+    def __post_init__(self):
+        if self.tokens is None:
+            self.tokens = self.capacity
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.updated_at = now
+
+    def reserve(self, max_wait: float):
+        """
+        Take the next token and return the seconds until it may be used.
+        Tokens can be taken ahead of time, so waiting deliveries are served in
+        arrival order. If the wait would be longer than max_wait nothing is
+        taken and the second value is False.
+        """
+        now = time.monotonic()
+        self._refill(now)
+
+        delay = max(self.paused_until - now, (1 - self.tokens) / self.refill_rate, 0.0)
+        if delay > max_wait:
+            return delay, False
+
+        self.tokens -= 1
+        return delay, True
+
+    def refund(self):
+        self.tokens += 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def limit_to(self, remaining: int):
+        self.tokens = min(self.tokens, remaining)
+
+
+def get_retry_after(value: str):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_header_number(value: str, cast=int):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_graph_usage(value: str):
+    """
+    Return (highest usage percent, seconds until access is regained)
+    from Graph API x-app-usage or x-business-use-case-usage headers.
+    """
+    if not value:
+        return 0, 0
+    try:
+        usage = json.loads(value)
+    except ValueError:
+        return 0, 0
+
+    entries = [usage]
+    if all(isinstance(v, list) for v in usage.values()):
+        entries = [entry for values in usage.values() for entry in values]
+
+    percent = 0
+    regain_seconds = 0
+    for entry in entries:
+        for key in ("call_count", "total_time", "total_cputime"):
+            percent = max(percent, entry.get(key, 0))
+        regain_seconds = max(
+            regain_seconds, entry.get("estimated_time_to_regain_access", 0) * 60
+        )
+
+    return percent, regain_seconds
+
+
+class RateLimiter:
+    def __init__(self, limits: dict):
+        self.limits = limits
+        self.buckets: dict[tuple, TokenBucket] = {}
+
+    def _get_limit(self, platform: str, endpoint: str, scope: str):
+        """Return the limit of `scope` and the endpoint whose bucket counts it."""
+        limit = self.limits.get(f"{platform}:{endpoint}", {}).get(scope)
+        if limit:
+            return limit, endpoint
+        return self.limits.get(platform, {}).get(scope), None
+
+    def _get_bucket(self, platform: str, endpoint: str, scope: str, account_id: int):
+        limit, endpoint = self._get_limit(platform, endpoint, scope)
+        if not limit:
+            return None
+
+        key = (platform, endpoint, scope, account_id if scope == "account" else None)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            requests, period = limit
+            bucket = TokenBucket(capacity=requests, refill_rate=requests / period)
+            self.buckets[key] = bucket
+        return bucket
+
+    async def acquire(self, platform: str, account_id: int, endpoint: str):
+        """
+        Take a token from every bucket of the call before sleeping, so a
+        deferred call gives back what it took instead of using up the app quota.
+        """
+        reserved = []
+        delay = 0.0
+        for scope in ("app", "account"):
+            bucket = self._get_bucket(platform, endpoint, scope, account_id)
+            if not bucket:
+                continue
+            bucket_delay, taken = bucket.reserve(settings.POSTER_RATE_LIMIT_MAX_WAIT)
+            if not taken:
+                for reserved_bucket in reserved:
+                    reserved_bucket.refund()
+                raise ErrorRateLimitWait(platform, bucket_delay)
+            reserved.append(bucket)
+            delay = max(delay, bucket_delay)
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def update_from_response(
+        self, platform: str, account_id: int, endpoint: str, response
+    ):
+        headers = response.headers
+        app_bucket = self._get_bucket(platform, endpoint, "app", account_id)
+        account_bucket = self._get_bucket(platform, endpoint, "account", account_id)
+
+        # X reports the remaining user quota for the endpoint that was called
+        remaining = get_header_number(headers.get("x-rate-limit-remaining"))
+        if remaining is not None and account_bucket:
+            account_bucket.limit_to(remaining)
+            reset = get_header_number(headers.get("x-rate-limit-reset"), float)
+            if remaining == 0 and reset:
+                account_bucket.pause(reset - time.time())
+
+        # Graph API reports usage as a percent of the quota
+        app_percent, app_regain = get_graph_usage(headers.get("x-app-usage"))
+        if app_bucket and app_percent >= 100:
+            app_bucket.pause(app_regain or settings.POSTER_RATE_LIMIT_BACKOFF)
+
+        page_percent, page_regain = get_graph_usage(
+            headers.get("x-business-use-case-usage")
+        )
+        if account_bucket and (page_percent >= 100 or page_regain):
+            account_bucket.pause(page_regain or settings.POSTER_RATE_LIMIT_BACKOFF)
+
+        if response.status_code == 429:
+            retry_after = get_retry_after(headers.get("retry-after"))
+            pause = retry_after or settings.POSTER_RATE_LIMIT_BACKOFF
+            log.warning(
+                f"{platform} rate limited account {account_id}, pausing {pause:.0f}s."
+            )
+            for bucket in (account_bucket, app_bucket):
+                if bucket:
+                    bucket.pause(pause)
+                    break
+
+
+rate_limiter = RateLimiter({**DEFAULT_RATE_LIMITS, **settings.POSTER_RATE_LIMITS})
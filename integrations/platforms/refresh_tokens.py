@@ -1,11 +1,16 @@
 import requests
+from threading import Event
 from datetime import datetime
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 from core import settings
+from django.db import connections
 from django.utils import timezone
 from core.logger import log, send_notification
+from integrations.aes import get_cipher
 from integrations.models import IntegrationsModel, Platform
-from django.db.models import Q
+from integrations.repository import integration_repository
+from django.db.models import Q, Min
 
 
 def refresh_access_token_for_x(integration: IntegrationsModel):
@@ -15,7 +20,7 @@ def refresh_access_token_for_x(integration: IntegrationsModel):
         return
 
     try:
-        token_url = "https://api.x.com/2/oauth2/token"
+        token_url = f"{settings.X_API_URL}/2/oauth2/token"
 
         headers = {
             "Content-Type": "application/x-www-form-urlencoded",
@@ -72,22 +77,9 @@ def refresh_access_token_for_linkedin(integration: IntegrationsModel):
     )
 
 
-def refresh_access_token_for_instagram(
-    account_id: int, access_token: str, access_expire: datetime
-):
-
-    integration = IntegrationsModel.objects.filter(
-        account_id=account_id, platform=Platform.INSTAGRAM.value
-    ).first()
-
-    integration.access_token = access_token
-    integration.access_expire = access_expire
-    integration.save()
-
-
 def refresh_access_token_for_facebook(integration: IntegrationsModel):
     try:
-        token_url = "https://graph.facebook.com/v22.0/oauth/access_token"
+        token_url = f"{settings.GRAPH_API_URL}/v22.0/oauth/access_token"
         params = {
             "grant_type": "fb_exchange_token",
             "client_id": settings.FACEBOOK_CLIENT_ID,
@@ -108,14 +100,17 @@ def refresh_access_token_for_facebook(integration: IntegrationsModel):
         if not new_access_token:
             raise ValueError("Failed to retrieve new access token.")
 
-        access_expire = timezone.now() + timedelta(days=60)
-        integration.access_token = new_access_token
-        integration.access_expire = access_expire
-        integration.save()
-
-        refresh_access_token_for_instagram(
-            integration.account_id, new_access_token, access_expire
+        # Instagram posts with the same page token, one UPDATE changes both rows
+        platforms = [Platform.FACEBOOK.value, Platform.INSTAGRAM.value]
+        IntegrationsModel.objects.filter(
+            account_id=integration.account_id, platform__in=platforms
+        ).update(
+            access_token=get_cipher(settings.SECRET_KEY).encrypt(new_access_token),
+            access_expire=timezone.now() + timedelta(days=60),
         )
+        # update() sends no signals
+        for platform in platforms:
+            integration_repository.invalidate(integration.account_id, platform)
 
         log.success(f"Facebook token refreshed for account {integration.account_id}")
 
@@ -138,20 +133,88 @@ refresh_methods = {
 }
 
 
-def refresh_tokens():
+def refresh_integration(integration: IntegrationsModel):
     try:
+        refresh_methods[integration.platform](integration)
+    finally:
+        # Worker threads open their own database connections
+        connections.close_all()
 
-        time_threshold = timezone.now() + timedelta(minutes=15)
 
-        integrations = IntegrationsModel.objects.filter(
-            Q(access_expire__lte=time_threshold) | Q(refresh_expire__lte=time_threshold)
+def refresh_tokens(now: datetime = None):
+    try:
+        now = now or timezone.now()
+        time_threshold = now + timedelta(seconds=settings.POSTER_TOKEN_REFRESH_MARGIN)
+
+        integrations = list(
+            IntegrationsModel.objects.filter(
+                Q(access_expire__lte=time_threshold)
+                | Q(refresh_expire__lte=time_threshold),
+                platform__in=refresh_methods,
+            )
         )
-
-        for integration in integrations:
-            refresh_method = refresh_methods.get(integration.platform)
-            if refresh_method:
-                refresh_method(integration)
+        if not integrations:
+            return
+
+        log.info(f"Refreshing {len(integrations)} integration tokens.")
+        with ThreadPoolExecutor(settings.POSTER_TOKEN_REFRESH_WORKERS) as executor:
+            for future in [
+                executor.submit(refresh_integration, integration)
+                for integration in integrations
+            ]:
+                err = future.exception()
+                if err:
+                    log.exception(err)
 
     except Exception as err:
         log.exception(err)
         send_notification(f"ImPosting", "Could not refresh tokens because {err}")
+
+
+def get_next_refresh_at():
+    expires = IntegrationsModel.objects.filter(platform__in=refresh_methods).aggregate(
+        access_expire=Min("access_expire"), refresh_expire=Min("refresh_expire")
+    )
+    expires = [expire for expire in expires.values() if expire]
+    if not expires:
+        return None
+    return min(expires) - timedelta(seconds=settings.POSTER_TOKEN_REFRESH_MARGIN)
+
+
+class TokenRefresher:
+    """
+    Refreshes tokens on their own schedule, off the posting loop.
+
+    Sleeps until the earliest token is within POSTER_TOKEN_REFRESH_MARGIN of
+    expiring. New integrations are picked up at the next re-check, at most
+    POSTER_TOKEN_REFRESH_RESYNC_SECONDS later.
+    """
+
+    def __init__(
+        self,
+        resync_seconds: float = settings.POSTER_TOKEN_REFRESH_RESYNC_SECONDS,
+        retry_seconds: float = 60,
+    ):
+        self.resync_seconds = resync_seconds
+        self.retry_seconds = retry_seconds
+
+    def get_sleep_seconds(self):
+        next_refresh_at = get_next_refresh_at()
+        if next_refresh_at is None:
+            return self.resync_seconds
+        seconds = (next_refresh_at - timezone.now()).total_seconds()
+        return min(max(seconds, 0), self.resync_seconds)
+
+    def run(self, stop_event: Event):
+        while not stop_event.is_set():
+            try:
+                sleep_seconds = self.get_sleep_seconds()
+                if sleep_seconds <= 0:
+                    refresh_tokens()
+                    # Tokens still close to expiring, like LinkedIn's, wait a bit
+                    sleep_seconds = self.retry_seconds
+                stop_event.wait(sleep_seconds)
+            except Exception as err:
+                log.exception(err)
+                stop_event.wait(5)
+        connections.close_all()
@@ -0,0 +1,162 @@
+import time
+import httpx
+import asyncio
+from weakref import WeakSet
+from dataclasses import dataclass
+from core import settings
+from core.logger import log
+from integrations.metrics import metrics
+from .common import ErrorRateLimited
+from .ratelimit import rate_limiter
+
+
+_clients: dict[str, httpx.AsyncClient] = {}
+# Connections opened ahead of a burst that no delivery has used yet
+_prewarmed: dict[str, WeakSet] = {}
+
+
+def get_client(platform: str):
+    """
+    Return the pooled async client for a platform.
+    Clients are bound to the poster event loop and reused across ticks.
+    """
+    client = _clients.get(platform)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=settings.POSTER_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.POSTER_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.POSTER_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=settings.POSTER_HTTP_KEEPALIVE_SECONDS,
+            ),
+            follow_redirects=True,
+        )
+        _clients[platform] = client
+    return client
+
+
+async def close_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+    _prewarmed.clear()
+
+
+async def open_connection(platform: str, url: str, timeout: float):
+    """
+    Send a HEAD request so the pool keeps its connection alive.
+    Returns the network stream if the request had to open a new one.
+    """
+    connected = False
+
+    async def trace(event_name: str, info: dict):
+        nonlocal connected
+        if event_name == "connection.connect_tcp.complete":
+            connected = True
+
+    try:
+        response = await asyncio.wait_for(
+            get_client(platform).head(url, extensions={"trace": trace}), timeout
+        )
+    except (httpx.HTTPError, asyncio.TimeoutError) as err:
+        log.debug(f"Could not prewarm a {platform} connection: {err!r}")
+        return None
+    if not connected:
+        return None
+    return response.extensions.get("network_stream")
+
+
+async def prewarm_connections(platform: str, url: str, count: int, timeout: float):
+    """
+    Open up to count pooled connections to a platform before a burst.
+    Concurrent requests each hold a connection, so the pool keeps all of them.
+    Connections not open within timeout are given up on.
+    """
+    count = min(count, settings.POSTER_HTTP_MAX_CONNECTIONS)
+    streams = await asyncio.gather(
+        *[open_connection(platform, url, timeout) for _ in range(count)]
+    )
+    prewarmed = _prewarmed.setdefault(platform, WeakSet())
+    opened = 0
+    for stream in streams:
+        if stream is not None:
+            prewarmed.add(stream)
+            opened += 1
+    metrics.inc("poster_prewarmed_connections_total", opened, platform=platform)
+    return opened
+
+
+def record_connection_use(platform: str, response: httpx.Response):
+    # The first request on a prewarmed connection skipped DNS, TCP and TLS setup
+    prewarmed = _prewarmed.get(platform)
+    if not prewarmed:
+        return
+    stream = response.extensions.get("network_stream")
+    if stream is not None and stream in prewarmed:
+        prewarmed.discard(stream)
+        metrics.inc("poster_cold_connects_avoided_total", platform=platform)
+
+
+@dataclass
+class PlatformClient:
+    """
+    Rate limited view of a platform client for one account.
+    Requests wait for their token bucket instead of failing and
+    429 responses are queued again after the advertised pause.
+    """
+
+    platform: str
+    account_id: int = None
+    waited: float = 0.0
+
+    async def request(self, method: str, url: str, endpoint: str = "default", **kwargs):
+        client = get_client(self.platform)
+
+        for _ in range(settings.POSTER_RATE_LIMIT_RETRIES + 1):
+            waited = await rate_limiter.acquire(self.platform, self.account_id, endpoint)
+            self.waited += waited
+            metrics.observe(
+                "poster_rate_limit_wait_seconds",
+                waited,
+                platform=self.platform,
+                endpoint=endpoint,
+            )
+
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                metrics.inc(
+                    "poster_requests_total", platform=self.platform, status="error"
+                )
+                raise
+            record_connection_use(self.platform, response)
+            metrics.observe(
+                "poster_request_seconds",
+                time.perf_counter() - started,
+                platform=self.platform,
+                endpoint=endpoint,
+            )
+            metrics.inc(
+                "poster_requests_total",
+                platform=self.platform,
+                status=f"{response.status_code // 100}xx",
+            )
+            rate_limiter.update_from_response(
+                self.platform, self.account_id, endpoint, response
+            )
+            if response.status_code != 429:
+                return response
+
+            log.warning(f"{self.platform} request requeued after 429: {url}")
+
+        raise ErrorRateLimited(self.platform)
+
+    async def get(self, url: str, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs):
+        return await self.request("PUT", url, **kwargs)
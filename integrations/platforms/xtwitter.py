@@ -1,14 +1,12 @@
-import os
-import time
 from typing import Literal
 import mimetypes
 from core import settings
-from core.logger import log, send_notification
+from core.logger import log
 from dataclasses import dataclass
-from asgiref.sync import sync_to_async
-from socialsched.models import PostModel
-from requests_oauthlib import OAuth2Session
-from integrations.models import IntegrationsModel
+from integrations.models import IntegrationsModel, Platform
+from integrations.metrics import metrics
+from .transport import PlatformClient
+from .xupload import upload_media
 from .common import (
     ErrorAccessTokenNotProvided,
     ErrorThisTypeOfPostIsNotSupported,
@@ -19,29 +17,31 @@ from .common import (
 class XPoster:
     integration: IntegrationsModel
     api_version: str = "2"
-    chunk_size: int = 1024 * 1024  # 1MB
+    chunk_size: int = settings.X_UPLOAD_SEGMENT_SIZE
 
     def __post_init__(self):
         self.access_token = self.integration.access_token_value
         if not self.access_token:
             raise ErrorAccessTokenNotProvided
 
-        self.base_url = f"https://api.x.com/{self.api_version}/tweets"
-        self.upload_url = f"https://api.x.com/{self.api_version}/media/upload"
-        self.client = OAuth2Session(
-            client_id=settings.X_CLIENT_ID,
-            token={"access_token": self.access_token, "token_type": "bearer"},
+        self.base_url = f"{settings.X_API_URL}/{self.api_version}/tweets"
+        self.upload_url = f"{settings.X_API_URL}/{self.api_version}/media/upload"
+        self.client = PlatformClient(
+            Platform.X_TWITTER.value, self.integration.account_id
         )
 
-    def _make_authenticated_request(
+    async def _make_authenticated_request(
         self, method: Literal["post", "get"], url: str, **kwargs
     ):
-        response = getattr(self.client, method)(url, **kwargs)
+        headers = kwargs.pop("headers", {})
+        headers["Authorization"] = f"Bearer {self.access_token}"
+        response = await self.client.request(
+            method.upper(), url, headers=headers, **kwargs
+        )
         response.raise_for_status()
         return response
 
-    def _upload_media(self, media_path: str):
-        total_bytes = os.path.getsize(media_path)
+    async def _upload_media(self, media_path: str):
         mime_type, _ = mimetypes.guess_type(media_path)
         if not mime_type:
             raise ValueError(f"Cannot determine MIME type for {media_path}")
@@ -55,69 +55,13 @@ class XPoster:
         else:
             raise ErrorThisTypeOfPostIsNotSupported
 
-        init_response = self._make_authenticated_request(
-            "post",
-            self.upload_url,
-            files={
-                "command": (None, "INIT"),
-                "media_type": (None, mime_type),
-                "total_bytes": (None, str(total_bytes)),
-                "media_category": (None, media_category),
-            },
-        )
-        media_id = init_response.json()["data"]["id"]
-
-        with open(media_path, "rb") as f:
-            for segment_index, chunk in enumerate(
-                iter(lambda: f.read(self.chunk_size), b"")
-            ):
-                self._make_authenticated_request(
-                    "post",
-                    self.upload_url,
-                    files={
-                        "command": (None, "APPEND"),
-                        "media_id": (None, media_id),
-                        "segment_index": (None, str(segment_index)),
-                        "media": ("media", chunk),
-                    },
-                )
-
-        finalize_response = self._make_authenticated_request(
-            "post",
-            self.upload_url,
-            files={
-                "command": (None, "FINALIZE"),
-                "media_id": (None, media_id),
-            },
-        )
-
-        processing_info = (
-            finalize_response.json().get("data", {}).get("processing_info")
-        )
-        if processing_info:
-            self._wait_for_processing(media_id)
-
-        return media_id
-
-    def _wait_for_processing(self, media_id):
-        while True:
-            response = self._make_authenticated_request(
-                "get", f"{self.upload_url}?command=STATUS&media_id={media_id}"
-            )
-            info = response.json().get("data", {}).get("processing_info")
-
-            if not info or info.get("state") == "succeeded":
-                return
-            if info.get("state") == "failed":
-                raise Exception(f"Media processing failed: {info.get('error')}")
-
-            time.sleep(info.get("check_after_secs", 5))
+        return await upload_media(self, media_path, mime_type, media_category)
 
     def get_post_url(self, id: int):
         return f"https://x.com/user/status/{id}"
 
-    def post_text(self, text: str):
-        response = self._make_authenticated_request(
+    async def post_text(self, text: str):
+        response = await self._make_authenticated_request(
             "post",
             self.base_url,
             headers={"Content-Type": "application/json"},
@@ -125,9 +69,12 @@ class XPoster:
         )
         return self.get_post_url(response.json()["data"]["id"])
 
-    def post_text_with_media(self, text: str, media_path: str):
-        media_id = self._upload_media(media_path)
-        response = self._make_authenticated_request(
+    async def post_text_with_media(
+        self, text: str, media_path: str, media_id: str = None
+    ):
+        if media_id is None:
+            media_id = await self._upload_media(media_path)
+        response = await self._make_authenticated_request(
             "post",
             self.base_url,
             headers={"Content-Type": "application/json"},
@@ -135,20 +82,26 @@ class XPoster:
         )
         return self.get_post_url(response.json()["data"]["id"])
 
-    def make_post(self, text: str, media_path: str = None):
+    def is_supported_media(self, media_path: str):
+        return media_path.endswith(
+            (".jpg", ".jpeg", ".png", ".gif", ".mp4", ".mov")
+        )
+
+    async def stage(self, text: str, media_path: str = None):
         if not media_path:
-            return self.post_text(text)
-        if media_path.endswith((".jpg", ".jpeg", ".png", ".gif", ".mp4", ".mov")):
-            return self.post_text_with_media(text, media_path)
+            return None
+        if self.is_supported_media(media_path):
+            return await self._upload_media(media_path)
         raise ErrorThisTypeOfPostIsNotSupported
 
-
-@sync_to_async
-def update_x_link(post_id: int, post_url: str):
-    post = PostModel.objects.get(id=post_id)
-    post.link_x = post_url
-    post.post_on_x = False
-    post.save(skip_validation=True)
+    async def make_post(
+        self, text: str, media_path: str = None, staged_ref: str = None
+    ):
+        if not media_path:
+            return await self.post_text(text)
+        if self.is_supported_media(media_path):
+            return await self.post_text_with_media(text, media_path, staged_ref)
+        raise ErrorThisTypeOfPostIsNotSupported
 
 
 async def post_on_x(
@@ -156,18 +109,24 @@ async def post_on_x(
     post_id: int,
     post_text: str,
     media_path: str = None,
+    staged_ref: str = None,
 ):
-    post_url = None
-    try:
-        poster = XPoster(integration)
-        post_url = poster.make_post(post_text, media_path)
-        log.success(f"X post url: {integration.account_id} {post_url}")
-    except Exception as err:
-        log.error(f"X post error: {integration.account_id} {err}")
-        log.exception(err)
-        send_notification(
-            "ImPosting", f"AccountId: {integration.account_id} got error {str(err)}"
-        )
-        await sync_to_async(integration.delete)()
+    poster = XPoster(integration)
+    post_url = await poster.make_post(post_text, media_path, staged_ref)
+    metrics.observe(
+        "poster_delivery_rate_limit_wait_seconds",
+        poster.client.waited,
+        platform=Platform.X_TWITTER.value,
+    )
+    log.success(f"X post url: {integration.account_id} {post_url}")
 
-    await update_x_link(post_id, post_url)
+    return post_url
+
+
+async def stage_on_x(
+    integration: IntegrationsModel,
+    post_text: str,
+    media_path: str = None,
+):
+    # The uploaded media id can be used in a tweet for 24 hours
+    return await XPoster(integration).stage(post_text, media_path)
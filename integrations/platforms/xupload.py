@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+from math import ceil
+from dataclasses import dataclass, field
+from core import settings
+from core.logger import log
+
+
+@dataclass
+class UploadSession:
+    """An X chunked upload, kept so a failed upload resumes where it stopped."""
+
+    media_id: str
+    total_bytes: int
+    segment_size: int
+    acked: set = field(default_factory=set)
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def segment_count(self):
+        return max(ceil(self.total_bytes / self.segment_size), 1)
+
+    def get_missing_segments(self):
+        return [
+            index for index in range(self.segment_count) if index not in self.acked
+        ]
+
+
+# (account_id, path, size, mtime) -> session of an upload that did not finish
+_sessions: dict[tuple, UploadSession] = {}
+
+
+def get_session_key(account_id: int, media_path: str):
+    stat = os.stat(media_path)
+    return (account_id, media_path, stat.st_size, stat.st_mtime_ns)
+
+
+def prune_sessions():
+    now = time.monotonic()
+    for key, session in list(_sessions.items()):
+        if now - session.created_at >= settings.X_UPLOAD_SESSION_SECONDS:
+            del _sessions[key]
+
+
+async def append_segments(poster, session: UploadSession, media_path: str):
+    """
+    Send the segments X has not acknowledged yet, a few at a time.
+    Segments are read with pread so concurrent reads share one descriptor.
+    """
+    semaphore = asyncio.Semaphore(settings.X_UPLOAD_CONCURRENCY)
+    fd = os.open(media_path, os.O_RDONLY)
+
+    async def append(index: int):
+        async with semaphore:
+            offset = index * session.segment_size
+            chunk = await asyncio.to_thread(os.pread, fd, session.segment_size, offset)
+            await poster._make_authenticated_request(
+                "post",
+                poster.upload_url,
+                endpoint="media",
+                files={
+                    "command": (None, "APPEND"),
+                    "media_id": (None, session.media_id),
+                    "segment_index": (None, str(index)),
+                    "media": ("media", chunk),
+                },
+            )
+            session.acked.add(index)
+
+    try:
+        results = await asyncio.gather(
+            *[append(index) for index in session.get_missing_segments()],
+            return_exceptions=True,
+        )
+    finally:
+        os.close(fd)
+
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def upload_media(poster, media_path: str, mime_type: str, media_category: str):
+    prune_sessions()
+    key = get_session_key(poster.integration.account_id, media_path)
+    session = _sessions.get(key)
+
+    if session is None:
+        total_bytes = key[2]
+        init_response = await poster._make_authenticated_request(
+            "post",
+            poster.upload_url,
+            endpoint="media",
+            files={
+                "command": (None, "INIT"),
+                "media_type": (None, mime_type),
+                "total_bytes": (None, str(total_bytes)),
+                "media_category": (None, media_category),
+            },
+        )
+        session = UploadSession(
+            media_id=init_response.json()["data"]["id"],
+            total_bytes=total_bytes,
+            segment_size=poster.chunk_size,
+        )
+        _sessions[key] = session
+    else:
+        log.info(
+            f"Resuming X upload {session.media_id} at "
+            f"{len(session.acked)}/{session.segment_count} segments."
+        )
+
+    await append_segments(poster, session, media_path)
+
+    finalize_response = await poster._make_authenticated_request(
+        "post",
+        poster.upload_url,
+        endpoint="media",
+        files={
+            "command": (None, "FINALIZE"),
+            "media_id": (None, session.media_id),
+        },
+    )
+    # Once finalized the media id is complete, a retry posts with a fresh upload
+    _sessions.pop(key, None)
+
+    processing_info = finalize_response.json().get("data", {}).get("processing_info")
+    if processing_info:
+        await processing_poller.wait(
+            poster, session.media_id, processing_info.get("check_after_secs", 1)
+        )
+
+    return session.media_id
+
+
+class ProcessingPoller:
+    """
+    Polls STATUS for every media id still processing from a single task,
+    each id as often as X asks for in check_after_secs.
+    """
+
+    def __init__(self):
+        # media_id -> [poster, future, next check on the loop clock]
+        self.waiting: dict[str, list] = {}
+        self.task: asyncio.Task = None
+
+    async def wait(self, poster, media_id: str, check_after: float):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.waiting[media_id] = [poster, future, loop.time() + check_after]
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+        await future
+
+    async def check(self, poster, media_id: str):
+        """Return the seconds until the next check or None once processed."""
+        response = await poster._make_authenticated_request(
+            "get",
+            f"{poster.upload_url}?command=STATUS&media_id={media_id}",
+            endpoint="media",
+        )
+        info = response.json().get("data", {}).get("processing_info")
+        if not info or info.get("state") == "succeeded":
+            return None
+        if info.get("state") == "failed":
+            raise Exception(f"Media processing failed: {info.get('error')}")
+        return info.get("check_after_secs", 5)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.waiting:
+            now = loop.time()
+            due = [
+                (media_id, entry)
+                for media_id, entry in self.waiting.items()
+                if entry[2] <= now
+            ]
+            results = await asyncio.gather(
+                *[self.check(entry[0], media_id) for media_id, entry in due],
+                return_exceptions=True,
+            )
+            for (media_id, entry), result in zip(due, results):
+                future = entry[1]
+                if future.done():
+                    del self.waiting[media_id]
+                elif isinstance(result, BaseException):
+                    del self.waiting[media_id]
+                    future.set_exception(result)
+                elif result is None:
+                    del self.waiting[media_id]
+                    future.set_result(None)
+                else:
+                    entry[2] = loop.time() + result
+
+            if self.waiting:
+                next_check = min(entry[2] for entry in self.waiting.values())
+                # Short naps so ids added meanwhile are not kept waiting long
+                await asyncio.sleep(min(max(next_check - loop.time(), 0), 1))
+
+
+processing_poller = ProcessingPoller()
@@ -1,153 +1,606 @@
+import os
+import time
+import uuid
+import socket
 import asyncio
+from threading import Event
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
 from core import settings
-from core.logger import log
+from core.logger import log, send_notification
+from django.db import transaction
+from django.db.models import Q, Count
 from django.utils import timezone
 from asgiref.sync import sync_to_async
 from socialsched.models import PostModel
-from zoneinfo import ZoneInfo
-from django.core.files.storage import default_storage
-from .models import IntegrationsModel, Platform
+from socialsched.rollup import record_post_links
+from .models import (
+    IntegrationsModel,
+    Platform,
+    PostDelivery,
+    DeliveryState,
+    DeadLetter,
+    PublishLedger,
+    LedgerState,
+    OPEN_DELIVERY_STATES,
+    get_ledger_key,
+)
+from .media import release_post_media
+from .repository import integration_repository
+from .metrics import metrics
+from .staging import (
+    claim_staging_deliveries,
+    stage_delivery,
+    write_staging_results,
+)
+from .retry import classify_error, get_retry_delay, AUTH, TRANSIENT
 from .platforms.linkedin import post_on_linkedin
 from .platforms.xtwitter import post_on_x
 from .platforms.facebook import post_on_facebook
 from .platforms.instagram import post_on_instagram
-from .platforms.refresh_tokens import refresh_tokens
+from .platforms.transport import close_clients
+from .platforms.common import (
+    ErrorRateLimitWait,
+    ErrorOutcomeUnknown,
+    PendingPermalink,
+)
 
 
-@sync_to_async
-def get_integration(account_id, platform):
-    return IntegrationsModel.objects.filter(
-        account_id=account_id, platform=platform
-    ).first()
+# Identifies this poster process in delivery leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
 
+DUE_DELIVERY_FIELDS = [
+    "id",
+    "platform",
+    "attempts",
+    "due_at",
+    "result_url",
+    "published_at",
+    "staged_ref",
+    "post__id",
+    "post__account_id",
+    "post__description",
+    "post__due_at_utc",
+    "post__media_file",
+]
 
-@sync_to_async
-def mark_post_posted(post_id):
-    return PostModel.objects.filter(id=post_id).update(posted=True)
+PLATFORM_POSTERS = {
+    Platform.X_TWITTER.value: post_on_x,
+    Platform.LINKEDIN.value: post_on_linkedin,
+    Platform.FACEBOOK.value: post_on_facebook,
+    Platform.INSTAGRAM.value: post_on_instagram,
+}
 
+LINK_FIELDS = {
+    Platform.X_TWITTER.value: "link_x",
+    Platform.LINKEDIN.value: "link_linkedin",
+    Platform.FACEBOOK.value: "link_facebook",
+    Platform.INSTAGRAM.value: "link_instagram",
+}
 
-@sync_to_async
-def delete_media_file(post_id: int):
-    post = PostModel.objects.get(id=post_id)
+# Ledger columns written when a platform call starts and when it ends
+LEDGER_RESULT_FIELDS = ["state", "worker", "result_url", "error", "finished_at"]
+LEDGER_START_FIELDS = LEDGER_RESULT_FIELDS + ["started_at"]
 
-    if post.media_file:
-        if default_storage.exists(post.media_file.path):
-            default_storage.delete(post.media_file.path)
-            post.media_file = None
+INTERRUPTED_ERROR = (
+    "Interrupted while publishing, check the platform before replaying."
+)
 
-    post.save(skip_validation=True)
+# Delivery columns written back at the end of a tick
+RESULT_FIELDS = [
+    "state",
+    "attempts",
+    "due_at",
+    "result_url",
+    "platform_ref",
+    "staged_ref",
+    "error",
+    "lease_owner",
+    "lease_expires_at",
+    "updated_at",
+    "published_at",
+]
 
+# Seconds between the scheduled time and the platform accepting the post
+LATENESS_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900, 3600, 21600, 86400)
 
-def post_scheduled_posts():
+# Graph API platforms fetch the media from our public url instead of an upload
+MEDIA_URL_PLATFORMS = [Platform.FACEBOOK.value, Platform.INSTAGRAM.value]
 
-    refresh_tokens()
 
-    potential_posts = PostModel.objects.filter(posted=False)
-    post_ids_to_publish = []
-    now_utc = timezone.now()
+def get_claimable_filter(now_utc):
+    # Deliveries leased by a worker that died are claimable again once the lease ends
+    return Q(state=DeliveryState.PENDING, due_at__lte=now_utc) | Q(
+        state=DeliveryState.SENDING, lease_expires_at__lte=now_utc
+    )
+
+
+def claim_due_deliveries(now_utc):
+    """
+    Lease a batch of due deliveries to this worker in a single UPDATE.
+    """
+    lease_expires_at = now_utc + timedelta(seconds=settings.POSTER_LEASE_SECONDS)
+    candidates = (
+        PostDelivery.objects.filter(get_claimable_filter(now_utc))
+        .order_by("due_at")
+        .values("id")[: settings.POSTER_BATCH_SIZE]
+    )
+    claimed = (
+        PostDelivery.objects.filter(id__in=candidates)
+        .filter(get_claimable_filter(now_utc))
+        .update(
+            state=DeliveryState.SENDING,
+            lease_owner=WORKER_ID,
+            lease_expires_at=lease_expires_at,
+            updated_at=now_utc,
+        )
+    )
+    if not claimed:
+        return []
+
+    return list(
+        PostDelivery.objects.filter(
+            lease_owner=WORKER_ID, lease_expires_at=lease_expires_at
+        )
+        .select_related("post")
+        .only(*DUE_DELIVERY_FIELDS)
+    )
+
+
+_poster_loop = None
+# Staging tasks still running on the poster loop, they outlive the tick
+_staging_tasks: set[asyncio.Task] = set()
 
-    for post in potential_posts:
-        target_tz = ZoneInfo(post.post_timezone)
-        scheduled_aware = post.scheduled_on.replace(tzinfo=target_tz)
-        now_in_target_tz = now_utc.astimezone(target_tz)
-        if now_in_target_tz >= scheduled_aware:
-            post_ids_to_publish.append(post.pk)
 
-    posts = PostModel.objects.filter(pk__in=post_ids_to_publish)
+def get_poster_loop():
+    # Platform clients keep their connection pools bound to this loop across ticks
+    global _poster_loop
+    if _poster_loop is None or _poster_loop.is_closed():
+        _poster_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_poster_loop)
+    return _poster_loop
 
-    if len(posts) == 0:
+
+def close_poster_loop():
+    global _poster_loop
+    if _poster_loop is None or _poster_loop.is_closed():
         return
+    for task in _staging_tasks:
+        task.cancel()
+    if _staging_tasks:
+        _poster_loop.run_until_complete(asyncio.wait(_staging_tasks))
+    _staging_tasks.clear()
+    _poster_loop.run_until_complete(close_clients())
+    _poster_loop.close()
+    _poster_loop = None
 
-    async def run_post_tasks():
-        async_tasks = []
-
-        cached_integrations = {}
-
-        for post in posts:
-            text = post.description
-            media_path = post.media_file.path if post.media_file else None
-            media_object = post.media_file if post.media_file else None
-            media_url = None
-            if media_object:
-                media_url = settings.APP_URL + media_object.url
-
-            # LINKEDIN
-            if post.post_on_linkedin:
-                linkedin_key = f"linkedin_integration_{post.account_id}"
-                if linkedin_key not in cached_integrations:
-                    linkedin_integration = await get_integration(
-                        post.account_id, Platform.LINKEDIN.value
-                    )
-                    if linkedin_integration:
-                        cached_integrations[linkedin_key] = linkedin_integration
-
-                if cached_integrations.get(linkedin_key):
-                    async_tasks.append(
-                        post_on_linkedin(
-                            cached_integrations[linkedin_key], post.id, text, media_path
-                        )
-                    )
 
-            # X
-            if post.post_on_x:
-                x_key = f"x_integration_{post.account_id}"
-                if x_key not in cached_integrations:
-                    x_integration = await get_integration(
-                        post.account_id, Platform.X_TWITTER.value
-                    )
-                    if x_integration:
-                        cached_integrations[x_key] = x_integration
+@sync_to_async
+def disable_integration(integration: IntegrationsModel):
+    # Several deliveries can fail on the same integration in one tick
+    if integration.pk is None:
+        return
+    integration.delete()
 
-                if cached_integrations.get(x_key):
-                    async_tasks.append(
-                        post_on_x(cached_integrations[x_key], post.id, text, media_path)
-                    )
 
-            # FACEBOOK
-            if post.post_on_facebook:
-                fb_key = f"facebook_integration_{post.account_id}"
-                if fb_key not in cached_integrations:
-                    facebook_integration = await get_integration(
-                        post.account_id, Platform.FACEBOOK.value
-                    )
-                    if facebook_integration:
-                        cached_integrations[fb_key] = facebook_integration
-
-                if cached_integrations.get(fb_key):
-                    async_tasks.append(
-                        post_on_facebook(
-                            cached_integrations[fb_key], post.id, text, media_url
-                        )
+@dataclass
+class DeliveryResult:
+    delivery: PostDelivery
+    state: str
+    post_url: str = None
+    # Post id on the platform when it went live without a readable link
+    platform_ref: str = None
+    error: str = None
+    retry_delay: float = None
+    # The platform call was cut off, whether it went through is unknown
+    interrupted: bool = False
+    # Queued until its rate limit bucket refills, not counted as an attempt
+    deferred: bool = False
+
+
+def write_delivery_results(results: list[DeliveryResult]):
+    """
+    Write the outcome of a tick in one transaction: the delivery rows,
+    dead letters, publish ledger, the post link columns and the posted flags.
+    """
+    now = timezone.now()
+    post_ids = list({result.delivery.post_id for result in results})
+
+    with transaction.atomic():
+        # A delivery whose lease was taken over by another worker is no longer ours
+        leased_ids = set(
+            PostDelivery.objects.filter(
+                id__in=[result.delivery.id for result in results],
+                state=DeliveryState.SENDING,
+                lease_owner=WORKER_ID,
+            ).values_list("id", flat=True)
+        )
+
+        deliveries = []
+        dead_letters = []
+        ledger_entries = []
+        links = defaultdict(list)
+        post_links = defaultdict(dict)
+        for result in results:
+            delivery = result.delivery
+            if not result.interrupted:
+                ledger_entries.append(
+                    PublishLedger(
+                        key=get_ledger_key(delivery.post_id, delivery.platform),
+                        post_id=delivery.post_id,
+                        platform=delivery.platform,
+                        state=(
+                            LedgerState.SUCCEEDED
+                            if result.state == DeliveryState.PUBLISHED
+                            else LedgerState.FAILED
+                        ),
+                        worker=WORKER_ID,
+                        result_url=result.post_url,
+                        error=result.error,
+                        finished_at=now,
                     )
+                )
+            if delivery.id not in leased_ids:
+                continue
 
-            # INSTAGRAM
-            if post.post_on_instagram:
-                ig_key = f"instagram_integration_{post.account_id}"
-                if ig_key not in cached_integrations:
-                    instagram_integration = await get_integration(
-                        post.account_id, Platform.INSTAGRAM.value
+            delivery.state = result.state
+            if not result.deferred:
+                delivery.attempts += 1
+            delivery.error = result.error
+            delivery.lease_owner = None
+            delivery.lease_expires_at = None
+            delivery.updated_at = now
+
+            if result.state == DeliveryState.PUBLISHED:
+                delivery.result_url = result.post_url
+                delivery.platform_ref = result.platform_ref
+                delivery.published_at = now
+                # Without a link the permalink backfill fills the column later
+                if result.post_url:
+                    link_field = LINK_FIELDS[delivery.platform]
+                    links[link_field].append(
+                        PostModel(id=delivery.post_id, **{link_field: result.post_url})
                     )
-                    if instagram_integration:
-                        cached_integrations[ig_key] = instagram_integration
-
-                if cached_integrations.get(ig_key):
-                    async_tasks.append(
-                        post_on_instagram(
-                            cached_integrations[ig_key], post.id, text, media_url
-                        )
+                    post_links[delivery.post_id][link_field] = result.post_url
+                metrics.inc(
+                    "poster_deliveries_published_total", platform=delivery.platform
+                )
+            elif result.deferred:
+                delivery.due_at = now + timedelta(seconds=result.retry_delay)
+                metrics.inc(
+                    "poster_delivery_deferrals_total", platform=delivery.platform
+                )
+            elif result.state == DeliveryState.PENDING:
+                delivery.due_at = now + timedelta(seconds=result.retry_delay)
+                # The retry uploads again, staged media may be what failed
+                delivery.staged_ref = None
+                metrics.inc(
+                    "poster_delivery_retries_total", platform=delivery.platform
+                )
+            else:
+                # Staged containers expire long before anyone replays the post
+                delivery.staged_ref = None
+                metrics.inc(
+                    "poster_delivery_failures_total", platform=delivery.platform
+                )
+                dead_letters.append(
+                    DeadLetter(
+                        post_id=delivery.post_id,
+                        platform=delivery.platform,
+                        attempts=delivery.attempts,
+                        error=result.error,
                     )
+                )
+
+            deliveries.append(delivery)
+
+        PostDelivery.objects.bulk_update(
+            deliveries, RESULT_FIELDS, batch_size=settings.POSTER_BATCH_SIZE
+        )
+        DeadLetter.objects.bulk_create(
+            dead_letters, batch_size=settings.POSTER_BATCH_SIZE
+        )
+        # Outcomes are recorded even when the lease was lost, the call did happen
+        PublishLedger.objects.bulk_create(
+            ledger_entries,
+            update_conflicts=True,
+            unique_fields=["key"],
+            update_fields=LEDGER_RESULT_FIELDS,
+            batch_size=settings.POSTER_BATCH_SIZE,
+        )
+        # Published posts move from scheduled to published in the calendar rollup
+        record_post_links(post_links)
+        for link_field, posts in links.items():
+            PostModel.objects.bulk_update(
+                posts, [link_field], batch_size=settings.POSTER_BATCH_SIZE
+            )
+
+        # A post counts as posted once none of its deliveries is left to send
+        open_posts = PostDelivery.objects.filter(
+            post_id__in=post_ids, state__in=OPEN_DELIVERY_STATES
+        ).values("post_id")
+        PostModel.objects.filter(id__in=post_ids).exclude(id__in=open_posts).update(
+            posted=True
+        )
+
+    log.debug(f"Wrote {len(deliveries)} delivery results for {len(post_ids)} posts.")
+
+
+def get_media_argument(platform: str, post: PostModel):
+    if not post.media_file:
+        return None
+    if platform in MEDIA_URL_PLATFORMS:
+        return settings.APP_URL + post.media_file.url
+    return post.media_file.path
+
+
+async def handle_delivery_error(
+    delivery: PostDelivery, integration: IntegrationsModel, err: Exception
+):
+    kind = classify_error(err)
+    error = f"{type(err).__name__}: {err}"
+    account_id = integration.account_id
+
+    if isinstance(err, ErrorRateLimitWait):
+        log.info(f"{delivery.platform} post queued: {account_id} {err}")
+        return DeliveryResult(
+            delivery,
+            DeliveryState.PENDING,
+            error=error,
+            retry_delay=err.retry_after,
+            deferred=True,
+        )
+
+    if isinstance(err, ErrorOutcomeUnknown):
+        # Same as a call cut off by a drain, the ledger entry stays started
+        log.warning(
+            f"{delivery.platform} post {delivery.post_id} outcome unknown: {err}, "
+            "sending it to dead letters."
+        )
+        return DeliveryResult(
+            delivery,
+            DeliveryState.FAILED,
+            error=INTERRUPTED_ERROR,
+            interrupted=True,
+        )
+
+    if (
+        kind == TRANSIENT
+        and delivery.attempts + 1 < settings.POSTER_RETRY_MAX_ATTEMPTS
+    ):
+        delay = get_retry_delay(delivery.attempts + 1, err)
+        log.warning(
+            f"{delivery.platform} post error: {account_id} {err}, retrying in {delay:.0f}s"
+        )
+        return DeliveryResult(
+            delivery, DeliveryState.PENDING, error=error, retry_delay=delay
+        )
 
-            await mark_post_posted(post.id)
+    log.error(f"{delivery.platform} post error: {account_id} {err}")
+    log.exception(err)
+    send_notification("ImPosting", f"AccountId: {account_id} got error {str(err)}")
 
-        log.debug(f"Gathered async tasks {len(async_tasks)} to run.")
-        return await asyncio.gather(*async_tasks)
+    if kind == AUTH:
+        await disable_integration(integration)
+
+    return DeliveryResult(delivery, DeliveryState.FAILED, error=error)
+
+
+async def deliver(delivery: PostDelivery, integration: IntegrationsModel):
+    post = delivery.post
+
+    if integration is None:
+        log.warning(f"{delivery.platform} integration not found for post {post.id}")
+        return DeliveryResult(
+            delivery, DeliveryState.FAILED, error="Integration not found."
+        )
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
     try:
-        log.debug(f"Running async posting for {now_utc}")
-        loop.run_until_complete(run_post_tasks())
-        loop.run_until_complete(delete_media_file(post.id))
-        log.debug(f"Finished async posting for {now_utc}")
-    finally:
-        loop.close()
+        post_url = await PLATFORM_POSTERS[delivery.platform](
+            integration,
+            post.id,
+            post.description,
+            get_media_argument(delivery.platform, post),
+            delivery.staged_ref,
+        )
+    except Exception as err:
+        return await handle_delivery_error(delivery, integration, err)
+
+    lateness = timezone.now() - post.due_at_utc
+    metrics.observe(
+        "poster_publish_lateness_seconds",
+        lateness.total_seconds(),
+        buckets=LATENESS_BUCKETS,
+        platform=delivery.platform,
+    )
+    if isinstance(post_url, PendingPermalink):
+        return DeliveryResult(
+            delivery, DeliveryState.PUBLISHED, platform_ref=post_url.post_id
+        )
+    return DeliveryResult(delivery, DeliveryState.PUBLISHED, post_url=post_url)
+
+
+def record_queue_depth(now_utc):
+    open_counts = dict(
+        PostDelivery.objects.filter(state__in=OPEN_DELIVERY_STATES)
+        .values_list("state")
+        .annotate(Count("id"))
+    )
+    due_count = PostDelivery.objects.filter(
+        state=DeliveryState.PENDING, due_at__lte=now_utc
+    ).count()
+    metrics.set("poster_due_deliveries", due_count)
+    for state in OPEN_DELIVERY_STATES:
+        metrics.set("poster_open_deliveries", open_counts.get(state, 0), state=state)
+
+
+def start_ledger_entries(deliveries: list[PostDelivery]):
+    """
+    Record that the platform calls for `deliveries` are about to start.
+
+    Returns the deliveries to call and results for the ones the ledger already
+    settles: published before, or cut off mid-call by a worker that died.
+    Those go to dead letters instead of being published a second time.
+    """
+    keys = [
+        get_ledger_key(delivery.post_id, delivery.platform) for delivery in deliveries
+    ]
+    entries = PublishLedger.objects.in_bulk(keys, field_name="key")
+
+    to_send = []
+    settled = []
+    for delivery, key in zip(deliveries, keys):
+        entry = entries.get(key)
+        if entry is None or entry.state == LedgerState.FAILED:
+            to_send.append(delivery)
+        elif entry.state == LedgerState.SUCCEEDED:
+            settled.append(
+                DeliveryResult(
+                    delivery, DeliveryState.PUBLISHED, post_url=entry.result_url
+                )
+            )
+        else:
+            log.warning(
+                f"{delivery.platform} post {delivery.post_id} was interrupted "
+                f"on {entry.worker}, sending it to dead letters."
+            )
+            settled.append(
+                DeliveryResult(
+                    delivery,
+                    DeliveryState.FAILED,
+                    error=INTERRUPTED_ERROR,
+                    interrupted=True,
+                )
+            )
+
+    now = timezone.now()
+    PublishLedger.objects.bulk_create(
+        [
+            PublishLedger(
+                key=get_ledger_key(delivery.post_id, delivery.platform),
+                post_id=delivery.post_id,
+                platform=delivery.platform,
+                state=LedgerState.STARTED,
+                worker=WORKER_ID,
+                started_at=now,
+            )
+            for delivery in to_send
+        ],
+        update_conflicts=True,
+        unique_fields=["key"],
+        update_fields=LEDGER_START_FIELDS,
+        batch_size=settings.POSTER_BATCH_SIZE,
+    )
+    return to_send, settled
+
+
+async def wait_with_drain(tasks: list[asyncio.Task], stop_event: Event = None):
+    """
+    Wait for `tasks`. Once `stop_event` is set they get POSTER_DRAIN_SECONDS
+    to finish and whatever is still running after that is cancelled.
+    """
+    pending = set(tasks)
+    deadline = None
+    while pending:
+        timeout = settings.POSTER_WATCH_SECONDS
+        if stop_event is not None and stop_event.is_set():
+            if deadline is None:
+                deadline = time.monotonic() + settings.POSTER_DRAIN_SECONDS
+                log.info(
+                    f"Draining {len(pending)} in-flight tasks "
+                    f"for up to {settings.POSTER_DRAIN_SECONDS:.0f}s."
+                )
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                log.warning(f"Cancelling {len(pending)} tasks at the drain deadline.")
+                for task in pending:
+                    task.cancel()
+                await asyncio.wait(pending)
+                return
+        _, pending = await asyncio.wait(pending, timeout=timeout)
+
+
+def collect_staging_results():
+    done = [task for task in _staging_tasks if task.done()]
+    if not done:
+        return
+    _staging_tasks.difference_update(done)
+    # Cancelled staging is harmless, the delivery does the full work when due
+    results = [task.result() for task in done if not task.cancelled()]
+    if results:
+        write_staging_results(results)
+
+
+def idle_poster_loop(stop_event: Event, timeout: float):
+    """
+    Sleep between ticks. Staging still in flight keeps running on the poster
+    loop meanwhile and its results are written as they finish.
+    """
+    if not _staging_tasks:
+        stop_event.wait(timeout)
+        return
+    get_poster_loop().run_until_complete(
+        asyncio.wait(set(_staging_tasks), timeout=timeout)
+    )
+    collect_staging_results()
+
+
+def post_scheduled_posts(stop_event: Event = None):
+    now_utc = timezone.now()
+    record_queue_depth(now_utc)
+    deliveries = claim_due_deliveries(now_utc)
+    upcoming = claim_staging_deliveries(now_utc, WORKER_ID)
+
+    if len(deliveries) == 0 and len(upcoming) == 0:
+        collect_staging_results()
+        return
+
+    integrations = integration_repository.get_many(
+        (delivery.post.account_id, delivery.platform)
+        for delivery in deliveries + upcoming
+    )
+
+    deliveries_to_send, results = start_ledger_entries(deliveries)
+
+    async def run_post_tasks():
+        delivery_tasks = []
+
+        for delivery in deliveries_to_send:
+            integration = integrations[(delivery.post.account_id, delivery.platform)]
+            delivery_tasks.append(asyncio.create_task(deliver(delivery, integration)))
+
+        # Staging is for posts due later, due deliveries never wait for it
+        for delivery in upcoming:
+            integration = integrations[(delivery.post.account_id, delivery.platform)]
+            media = get_media_argument(delivery.platform, delivery.post)
+            _staging_tasks.add(
+                asyncio.create_task(stage_delivery(delivery, integration, media))
+            )
+
+        log.debug(
+            f"Gathered async tasks {len(delivery_tasks)} to run "
+            f"and {len(upcoming)} to stage."
+        )
+        await wait_with_drain(delivery_tasks, stop_event)
+
+        return [
+            DeliveryResult(
+                delivery,
+                DeliveryState.FAILED,
+                error=INTERRUPTED_ERROR,
+                interrupted=True,
+            )
+            if task.cancelled()
+            else task.result()
+            for delivery, task in zip(deliveries_to_send, delivery_tasks)
+        ]
+
+    loop = get_poster_loop()
+    log.debug(f"Running async posting for {now_utc}")
+    results.extend(loop.run_until_complete(run_post_tasks()))
+    if results:
+        write_delivery_results(results)
+        release_post_media(list({delivery.post_id for delivery in deliveries}))
+    collect_staging_results()
+    log.debug(f"Finished async posting for {now_utc}")
@@ -0,0 +1,70 @@
+import asyncio
+from math import ceil
+from datetime import datetime, timedelta
+from core import settings
+from core.logger import log
+from django.db.models import Count
+from .models import Platform, PostDelivery, DeliveryState
+from .platforms.transport import prewarm_connections
+from .platforms.graphbatch import GRAPH_MAX_BATCH
+
+
+def get_platform_url(platform: str):
+    # Facebook and Instagram have separate pools to the same Graph host
+    if platform == Platform.X_TWITTER.value:
+        return settings.X_API_URL
+    if platform == Platform.LINKEDIN.value:
+        return settings.LINKEDIN_API_URL
+    return settings.GRAPH_API_URL
+
+
+def get_connection_count(platform: str, due_count: int):
+    # Batched Graph publishing sends up to GRAPH_MAX_BATCH deliveries per request
+    if settings.GRAPH_BATCH_REQUESTS and platform in (
+        Platform.FACEBOOK.value,
+        Platform.INSTAGRAM.value,
+    ):
+        due_count = ceil(due_count / GRAPH_MAX_BATCH)
+    return min(due_count, settings.POSTER_PREWARM_MAX_CONNECTIONS)
+
+
+def get_due_load(now_utc: datetime):
+    """Return platform -> deliveries due within POSTER_PREWARM_WINDOW_SECONDS."""
+    window_end = now_utc + timedelta(seconds=settings.POSTER_PREWARM_WINDOW_SECONDS)
+    return dict(
+        PostDelivery.objects.filter(
+            state=DeliveryState.PENDING, due_at__gt=now_utc, due_at__lte=window_end
+        )
+        .values_list("platform")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+
+def prewarm_platforms(loop: asyncio.AbstractEventLoop, now_utc: datetime):
+    """
+    Open pooled connections on the poster loop to the platforms the next
+    burst needs, about one per concurrent request it will make.
+    """
+    due_load = get_due_load(now_utc)
+    if not due_load:
+        return {}
+
+    platforms = list(due_load)
+    opened = loop.run_until_complete(
+        asyncio.gather(
+            *[
+                prewarm_connections(
+                    platform,
+                    get_platform_url(platform),
+                    get_connection_count(platform, due_load[platform]),
+                    # A slow host must not delay the burst it was warming up for
+                    settings.POSTER_PREWARM_SECONDS,
+                )
+                for platform in platforms
+            ]
+        )
+    )
+    prewarmed = dict(zip(platforms, opened))
+    log.debug(f"Prewarmed connections for {due_load} due deliveries: {prewarmed}")
+    return prewarmed
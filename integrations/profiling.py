@@ -0,0 +1,110 @@
+import time
+import pstats
+import cProfile
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from core import settings
+from core.logger import log
+
+
+class TickProfiler:
+    """
+    Low overhead profiling for the poster loop.
+
+    One tick out of every `sample_every` runs under cProfile and periodic
+    tracemalloc snapshots record where memory goes. Only the newest `keep`
+    artifacts of each kind are kept in `directory`.
+    """
+
+    def __init__(
+        self,
+        directory: Path = settings.POSTER_PROFILE_DIR,
+        sample_every: int = settings.POSTER_PROFILE_SAMPLE_EVERY,
+        snapshot_seconds: float = settings.POSTER_PROFILE_SNAPSHOT_SECONDS,
+        keep: int = settings.POSTER_PROFILE_KEEP,
+    ):
+        self.directory = Path(directory)
+        self.sample_every = max(sample_every, 1)
+        self.snapshot_seconds = snapshot_seconds
+        self.keep = keep
+        self.ticks = 0
+        self.last_snapshot = None
+        self.previous_snapshot = None
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # One frame per allocation keeps tracemalloc cheap enough to leave on
+        tracemalloc.start(1)
+        self.last_snapshot = time.monotonic()
+        log.info(
+            f"Profiling 1 in {self.sample_every} ticks into {self.directory}, "
+            f"memory snapshots every {self.snapshot_seconds:.0f}s."
+        )
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            self.take_snapshot()
+            tracemalloc.stop()
+
+    def get_path(self, prefix: str, suffix: str):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return self.directory / f"{prefix}-{stamp}{suffix}"
+
+    def rotate(self, pattern: str):
+        for path in sorted(self.directory.glob(pattern))[: -self.keep or None]:
+            path.unlink(missing_ok=True)
+
+    @contextmanager
+    def tick(self):
+        self.ticks += 1
+        if self.ticks % self.sample_every:
+            yield
+        else:
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                self.write_profile(profile, time.perf_counter() - started)
+
+        if time.monotonic() - self.last_snapshot >= self.snapshot_seconds:
+            self.take_snapshot()
+
+    def write_profile(self, profile: cProfile.Profile, elapsed: float):
+        path = self.get_path("tick", ".prof")
+        profile.dump_stats(path)
+
+        # A readable summary next to the binary stats for a quick look
+        with open(path.with_suffix(".txt"), "w") as f:
+            f.write(f"Tick {self.ticks} took {elapsed:.3f}s\n\n")
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats("cumulative").print_stats(40)
+
+        self.rotate("tick-*.prof")
+        self.rotate("tick-*.txt")
+        log.debug(f"Wrote tick profile {path.name} ({elapsed:.3f}s).")
+
+    def take_snapshot(self):
+        self.last_snapshot = time.monotonic()
+        snapshot = tracemalloc.take_snapshot()
+        path = self.get_path("heap", ".snapshot")
+        snapshot.dump(path)
+
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path.with_suffix(".txt"), "w") as f:
+            f.write(f"Traced memory: current {current} bytes, peak {peak} bytes\n\n")
+            if self.previous_snapshot is None:
+                top = snapshot.statistics("lineno")
+            else:
+                top = snapshot.compare_to(self.previous_snapshot, "lineno")
+            for stat in top[:40]:
+                f.write(f"{stat}\n")
+
+        self.previous_snapshot = snapshot
+        self.rotate("heap-*.snapshot")
+        self.rotate("heap-*.txt")
+        log.debug(f"Wrote memory snapshot {path.name}.")
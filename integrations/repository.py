@@ -0,0 +1,68 @@
+from core import settings
+from core.cache import TTLCache
+from .models import IntegrationsModel
+
+
+# Cached "no integration" entries are None, so misses need their own marker
+MISSING = object()
+
+
+class IntegrationRepository:
+    """
+    Integrations by (account_id, platform), loaded in one query per batch
+    and kept in a bounded LRU cache between ticks.
+
+    Saves and deletes in this process clear their entry right away, changes
+    made by other processes are picked up once an entry is `ttl_seconds` old.
+    Missing integrations are cached as None the same way.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.POSTER_INTEGRATION_CACHE_SIZE,
+        ttl_seconds: float = settings.POSTER_INTEGRATION_CACHE_SECONDS,
+    ):
+        self.cache = TTLCache(max_size, ttl_seconds)
+
+    def get_many(self, keys):
+        keys = set(keys)
+        found = {}
+        for key in keys:
+            integration = self.cache.get(key, MISSING)
+            if integration is not MISSING:
+                found[key] = integration
+
+        missing = keys - found.keys()
+        if not missing:
+            return found
+
+        loaded = dict.fromkeys(missing)
+        integrations = IntegrationsModel.objects.filter(
+            account_id__in={account_id for account_id, _ in missing},
+            platform__in={platform for _, platform in missing},
+        ).order_by("-id")
+        # Ordered so the oldest row wins if an account has duplicates
+        for integration in integrations:
+            key = (integration.account_id, integration.platform)
+            if key in loaded:
+                loaded[key] = integration
+        IntegrationsModel.decrypt_tokens(
+            [integration for integration in loaded.values() if integration]
+        )
+
+        self.cache.set_many(loaded.items())
+        found.update(loaded)
+        return found
+
+    def get(self, account_id: int, platform: str):
+        return self.get_many([(account_id, platform)])[(account_id, platform)]
+
+    def invalidate(self, account_id: int, platform: str):
+        self.cache.discard((account_id, platform))
+
+    def clear(self):
+        self.cache.clear()
+
+
+integration_repository = IntegrationRepository()
+
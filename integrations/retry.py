@@ -0,0 +1,69 @@
+import random
+import httpx
+from core import settings
+from .platforms.common import (
+    ErrorAccessTokenNotProvided,
+    ErrorRefreshTokenNotProvided,
+    ErrorAccessTokenOrUserIdNotFound,
+    ErrorRateLimited,
+    ErrorMediaNotReady,
+)
+
+
+TRANSIENT = "transient"
+AUTH = "auth"
+PERMANENT = "permanent"
+
+# Graph API error code for expired or invalidated access tokens
+GRAPH_INVALID_TOKEN_CODE = 190
+
+
+def get_graph_error_code(response: httpx.Response):
+    try:
+        return response.json().get("error", {}).get("code")
+    except ValueError:
+        return None
+
+
+def classify_error(err: Exception):
+    if isinstance(err, (ErrorRateLimited, ErrorMediaNotReady)):
+        return TRANSIENT
+
+    if isinstance(
+        err,
+        (
+            ErrorAccessTokenNotProvided,
+            ErrorRefreshTokenNotProvided,
+            ErrorAccessTokenOrUserIdNotFound,
+        ),
+    ):
+        return AUTH
+
+    if isinstance(err, httpx.HTTPStatusError):
+        status_code = err.response.status_code
+        if status_code == 429 or status_code >= 500:
+            return TRANSIENT
+        if status_code == 401:
+            return AUTH
+        if get_graph_error_code(err.response) == GRAPH_INVALID_TOKEN_CODE:
+            return AUTH
+        return PERMANENT
+
+    if isinstance(err, httpx.TransportError):
+        return TRANSIENT
+
+    return PERMANENT
+
+
+def get_retry_delay(attempts: int, err: Exception = None):
+    """Exponential backoff with equal jitter, at least the advertised retry time."""
+    ceiling = min(
+        settings.POSTER_RETRY_MAX_DELAY,
+        settings.POSTER_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+    )
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    if isinstance(err, ErrorRateLimited) and err.retry_after:
+        delay = max(delay, err.retry_after)
+
+    return delay
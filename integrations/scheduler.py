@@ -0,0 +1,144 @@
+import heapq
+import os
+import time
+from threading import Event
+from core import settings
+from core.logger import log
+from django.utils import timezone
+from .models import PostDelivery, DeliveryState
+
+
+def notify_poster():
+    try:
+        settings.POSTER_WAKEUP_FILE.touch()
+    except OSError as err:
+        log.warning(f"Could not notify poster: {err}")
+
+
+def get_wakeup_mtime():
+    try:
+        return os.stat(settings.POSTER_WAKEUP_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+class DueScheduler:
+    """
+    Keeps a min-heap of upcoming due deliveries, deliveries to stage,
+    bursts to prewarm connections for and expiring leases and sleeps
+    until the earliest one.
+
+    The web app touches POSTER_WAKEUP_FILE when posts are created, edited or
+    deleted, which makes the scheduler re-read the heap before its next sleep.
+    A full re-sync also happens every POSTER_RESYNC_SECONDS so the heap can
+    never drift from the database for long.
+    """
+
+    def __init__(
+        self,
+        resync_seconds: float = settings.POSTER_RESYNC_SECONDS,
+        watch_seconds: float = settings.POSTER_WATCH_SECONDS,
+        heap_size: int = settings.POSTER_HEAP_SIZE,
+    ):
+        self.resync_seconds = resync_seconds
+        self.watch_seconds = watch_seconds
+        self.heap_size = heap_size
+        self.heap: list[tuple[float, str, int]] = []
+        self.last_sync = 0.0
+        self.wakeup_mtime = get_wakeup_mtime()
+
+    def sync(self):
+        upcoming_deliveries = list(
+            PostDelivery.objects.filter(state=DeliveryState.PENDING)
+            .order_by("due_at")
+            .values_list("due_at", "id")[: self.heap_size]
+        )
+        # Deliveries leased by another worker only become claimable when the lease ends
+        leased_deliveries = (
+            PostDelivery.objects.filter(state=DeliveryState.SENDING)
+            .order_by("lease_expires_at")
+            .values_list("lease_expires_at", "id")[: self.heap_size]
+        )
+        self.heap = [
+            (due_at.timestamp(), "delivery", delivery_id)
+            for due_at, delivery_id in upcoming_deliveries
+        ]
+        if settings.POSTER_PREWARM_SECONDS > 0:
+            # One wake-up per due time is enough to warm every delivery of a burst
+            self.heap.extend(
+                (due_at.timestamp() - settings.POSTER_PREWARM_SECONDS, "prewarm", 0)
+                for due_at in {due_at for due_at, _ in upcoming_deliveries}
+            )
+        self.heap.extend(
+            (expires_at.timestamp(), "lease", delivery_id)
+            for expires_at, delivery_id in leased_deliveries
+        )
+        if settings.POSTER_STAGING_SECONDS > 0:
+            unstaged_deliveries = (
+                PostDelivery.objects.filter(
+                    state=DeliveryState.PENDING, attempts=0, staged_at__isnull=True
+                )
+                .order_by("due_at")
+                .values_list("due_at", "id")[: self.heap_size]
+            )
+            self.heap.extend(
+                (
+                    due_at.timestamp() - settings.POSTER_STAGING_SECONDS,
+                    "stage",
+                    delivery_id,
+                )
+                for due_at, delivery_id in unstaged_deliveries
+            )
+        heapq.heapify(self.heap)
+        self.last_sync = time.monotonic()
+        log.debug(f"Scheduler synced {len(self.heap)} upcoming deliveries.")
+
+    def pop_due(self):
+        now = timezone.now().timestamp()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, kind, object_id = heapq.heappop(self.heap)
+            due.append((kind, object_id))
+        return due
+
+    def seconds_until_next_due(self):
+        if not self.heap:
+            return None
+        return max(self.heap[0][0] - timezone.now().timestamp(), 0)
+
+    def _notified(self):
+        mtime = get_wakeup_mtime()
+        if mtime == self.wakeup_mtime:
+            return False
+        self.wakeup_mtime = mtime
+        return True
+
+    def wait_for_due(self, stop_event: Event, idle=None):
+        """
+        Block until a delivery is due or a periodic re-sync is needed.
+        Returns False if stop_event was set while waiting.
+        `idle(stop_event, timeout)` replaces the plain sleep if given.
+        """
+        while not stop_event.is_set():
+            if self._notified():
+                log.debug("Scheduler woken up by a schedule change.")
+                self.sync()
+
+            until_resync = self.resync_seconds - (time.monotonic() - self.last_sync)
+            if until_resync <= 0:
+                return True
+
+            until_due = self.seconds_until_next_due()
+            if until_due == 0:
+                return True
+
+            timeout = min(until_resync, self.watch_seconds)
+            if until_due is not None:
+                timeout = min(timeout, until_due)
+
+            if idle is None:
+                stop_event.wait(timeout)
+            else:
+                idle(stop_event, timeout)
+
+        return False
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import IntegrationsModel, TOKEN_FIELDS, token_cache
+from .repository import integration_repository
+
+
+@receiver(post_save, sender=IntegrationsModel)
+@receiver(post_delete, sender=IntegrationsModel)
+def invalidate_integration(sender, instance, **kwargs):
+    integration_repository.invalidate(instance.account_id, instance.platform)
+    token_cache.discard(*[(instance.pk, field) for field in TOKEN_FIELDS])
@@ -0,0 +1,321 @@
+import re
+import json
+import time
+import uuid
+import random
+import threading
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from core.logger import log
+
+
+@dataclass
+class SimulatorConfig:
+    latency: float = 0.05
+    jitter: float = 0.05
+    error_rate: float = 0.0
+    error_statuses: tuple = (500, 502, 503)
+    # Requests per access token allowed in each window, 0 disables the limit
+    rate_limit: int = 0
+    rate_limit_window: float = 900
+    # STATUS polls before an uploaded video is reported as processed
+    processing_polls: int = 2
+
+
+@dataclass
+class SimulatorState:
+    config: SimulatorConfig
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    windows: dict = field(default_factory=dict)
+    processing: dict = field(default_factory=dict)
+    # X media id -> media_category sent with its INIT
+    media_categories: dict = field(default_factory=dict)
+    requests: int = 0
+
+    def take_quota(self, key: str):
+        """Return (limit, remaining, reset timestamp) after counting one request."""
+        now = time.time()
+        with self.lock:
+            self.requests += 1
+            started, used = self.windows.get(key, (now, 0))
+            if now - started >= self.config.rate_limit_window:
+                started, used = now, 0
+            used += 1
+            self.windows[key] = (started, used)
+        reset = started + self.config.rate_limit_window
+        return self.config.rate_limit, self.config.rate_limit - used, reset
+
+    def poll_processing(self, media_id: str):
+        with self.lock:
+            polls = self.processing.get(media_id, 0) + 1
+            self.processing[media_id] = polls
+        return polls >= self.config.processing_polls
+
+    def init_upload(self, media_category: str):
+        media_id = new_id()
+        with self.lock:
+            self.media_categories[media_id] = media_category
+        return media_id
+
+    def finalize_upload(self, media_id: str):
+        with self.lock:
+            return self.media_categories.pop(media_id, None)
+
+
+def new_id():
+    return str(uuid.uuid4().int)[:18]
+
+
+def parse_multipart(content_type: str, body: bytes):
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = part.get_payload(decode=True)
+    return fields
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """
+    Answers the X, Graph and LinkedIn endpoints the posters call.
+    Tokens are never checked, every request is accepted unless an error
+    is injected or the token ran out of its rate limit window.
+    """
+
+    state: SimulatorState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload: dict = None, headers: dict = None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def read_fields(self, body: bytes):
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            return parse_multipart(content_type, body)
+        if content_type.startswith("application/json") and body:
+            return json.loads(body)
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        return {}
+
+    def get_token(self, query: dict):
+        authorization = self.headers.get("Authorization", "")
+        return authorization.removeprefix("Bearer ") or query.get(
+            "access_token", ["anonymous"]
+        )[0]
+
+    def get_platform(self, path: str):
+        if path.startswith("/2/"):
+            return "X"
+        if path.startswith("/v2/") or path.startswith("/upload/"):
+            return "LinkedIn"
+        return "Graph"
+
+    def get_limit_headers(
+        self, platform: str, limit: int, remaining: int, reset: float
+    ):
+        if platform == "X":
+            return {
+                "x-rate-limit-limit": str(limit),
+                "x-rate-limit-remaining": str(max(remaining, 0)),
+                "x-rate-limit-reset": str(int(reset)),
+            }
+        if platform == "Graph":
+            percent = min(100, int(100 * (limit - remaining) / limit))
+            usage = {"call_count": percent, "total_time": 0, "total_cputime": 0}
+            return {"x-app-usage": json.dumps(usage)}
+        return {}
+
+    def handle_request(self, method: str):
+        config = self.state.config
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        body = self.read_body()
+        platform = self.get_platform(url.path)
+
+        time.sleep(config.latency + random.uniform(0, config.jitter))
+
+        headers = {}
+        if config.rate_limit:
+            limit, remaining, reset = self.state.take_quota(
+                f"{platform}:{self.get_token(query)}"
+            )
+            headers = self.get_limit_headers(platform, limit, remaining, reset)
+            if remaining < 0:
+                headers["retry-after"] = str(max(int(reset - time.time()), 1))
+                self.send_json(429, {"error": "Too Many Requests"}, headers)
+                return
+        else:
+            with self.state.lock:
+                self.state.requests += 1
+
+        if config.error_rate and random.random() < config.error_rate:
+            status = random.choice(config.error_statuses)
+            self.send_json(status, {"error": "Injected error"}, headers)
+            return
+
+        status, payload, extra_headers = self.route(
+            method, url.path, query, self.read_fields(body)
+        )
+        self.send_json(status, payload, {**headers, **extra_headers})
+
+    def route(self, method: str, path: str, query: dict, fields: dict):
+        if path == "/2/tweets" and method == "POST":
+            return 201, {"data": {"id": new_id(), "text": fields.get("text")}}, {}
+
+        if path == "/2/media/upload":
+            return self.route_x_upload(method, query, fields)
+
+        if path == "/2/oauth2/token":
+            return 200, {"access_token": new_id(), "refresh_token": new_id()}, {}
+
+        if path.endswith("/assets") and method == "POST":
+            asset = f"urn:li:digitalmediaAsset:{new_id()}"
+            host = self.headers.get("Host")
+            upload_url = f"http://{host}/upload/{asset}"
+            mechanism = {
+                "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest": {
+                    "uploadUrl": upload_url
+                }
+            }
+            return 200, {"value": {"uploadMechanism": mechanism, "asset": asset}}, {}
+
+        if path.startswith("/upload/") and method == "PUT":
+            return 201, None, {}
+
+        if path.endswith("/ugcPosts") and method == "POST":
+            share = f"urn:li:share:{new_id()}"
+            return 201, {"id": share}, {"x-restli-id": share}
+
+        if path.endswith("/oauth/access_token"):
+            return 200, {"access_token": new_id(), "expires_in": 5184000}, {}
+
+        return self.route_graph(method, path, query, fields)
+
+    def route_x_upload(self, method: str, query: dict, fields: dict):
+        if method == "GET":
+            media_id = query.get("media_id", [""])[0]
+            if self.state.poll_processing(media_id):
+                info = {"state": "succeeded", "progress_percent": 100}
+            else:
+                info = {"state": "in_progress", "check_after_secs": 1}
+            return 200, {"data": {"id": media_id, "processing_info": info}}, {}
+
+        command = fields.get("command", b"").decode()
+        media_id = (fields.get("media_id") or b"").decode()
+        if command == "INIT":
+            media_type = fields.get("media_type", b"").decode()
+            media_id = self.state.init_upload(
+                fields.get("media_category", b"").decode()
+            )
+            return 200, {"data": {"id": media_id, "media_type": media_type}}, {}
+        if command == "APPEND":
+            return 204, None, {}
+        if command == "FINALIZE":
+            data = {"id": media_id}
+            # The client only sends media_category with INIT
+            if self.state.finalize_upload(media_id) == "tweet_video":
+                data["processing_info"] = {"state": "pending", "check_after_secs": 1}
+            return 200, {"data": data}, {}
+        return 400, {"error": f"Unknown command {command}"}, {}
+
+    def run_graph_batch(self, requests: list[dict]):
+        config = self.state.config
+        results = []
+        for request in requests:
+            if config.error_rate and random.random() < config.error_rate:
+                status = random.choice(config.error_statuses)
+                results.append({"code": status, "body": '{"error": "Injected error"}'})
+                continue
+            url = urlsplit("/" + request["relative_url"])
+            status, payload, _ = self.route_graph(
+                request["method"], url.path, parse_qs(url.query)
+            )
+            results.append({"code": status, "body": json.dumps(payload)})
+        return results
+
+    def route_graph(
+        self, method: str, path: str, query: dict, fields: dict = None
+    ):
+        parts = [part for part in path.split("/") if part]
+        # Graph paths are /{version}/{node}/{edge} or /{node}
+        if parts and re.fullmatch(r"v\d+\.\d+", parts[0]):
+            parts = parts[1:]
+
+        if method == "POST" and not parts and "batch" in (fields or {}):
+            return 200, self.run_graph_batch(json.loads(fields["batch"])), {}
+
+        if method == "POST" and len(parts) == 2:
+            page_id, edge = parts
+            object_id = f"{page_id}_{new_id()}"
+            if edge == "feed":
+                return 200, {"id": object_id}, {}
+            if edge == "photos":
+                return 200, {"id": new_id(), "post_id": object_id}, {}
+            if edge in ("media", "media_publish"):
+                return 200, {"id": new_id()}, {}
+
+        if method == "GET" and len(parts) <= 1:
+            fields = query.get("fields", [""])[0].split(",")
+            if parts:
+                return 200, self.get_graph_object(parts[0], fields), {}
+            # Multi-id read, /?ids=a,b&fields=...
+            object_ids = query.get("ids", [""])[0].split(",")
+            payload = {
+                object_id: self.get_graph_object(object_id, fields)
+                for object_id in object_ids
+            }
+            return 200, payload, {}
+
+        return 404, {"error": {"message": f"Unknown path {path}"}}, {}
+
+    def get_graph_object(self, object_id: str, fields: list[str]):
+        payload = {"id": object_id}
+        if "permalink" in fields:
+            payload["permalink"] = f"https://www.instagram.com/p/{object_id}/"
+        if "status_code" in fields:
+            payload["status_code"] = "FINISHED"
+        return payload
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_HEAD(self):
+        # Connection prewarming, answered without latency or rate limits
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def make_simulator(host: str, port: int, config: SimulatorConfig):
+    state = SimulatorState(config)
+    handler = type("Handler", (SimulatorHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    log.info(f"Platform API simulator listening on http://{host}:{port}")
+    return server, state
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from core import settings
+from core.logger import log, send_notification
+from django.db import transaction
+from django.utils import timezone
+from socialsched.models import TextMaxLength
+from .models import IntegrationsModel, Platform, PostDelivery, DeliveryState
+from .platforms.xtwitter import stage_on_x
+from .platforms.linkedin import stage_on_linkedin
+from .platforms.facebook import stage_on_facebook
+from .platforms.instagram import stage_on_instagram
+
+
+PLATFORM_STAGERS = {
+    Platform.X_TWITTER.value: stage_on_x,
+    Platform.LINKEDIN.value: stage_on_linkedin,
+    Platform.FACEBOOK.value: stage_on_facebook,
+    Platform.INSTAGRAM.value: stage_on_instagram,
+}
+
+MAX_TEXT_LENGTHS = {
+    Platform.X_TWITTER.value: TextMaxLength.X_BLUE,
+    Platform.LINKEDIN.value: TextMaxLength.LINKEDIN,
+    Platform.FACEBOOK.value: TextMaxLength.FACEBOOK,
+    Platform.INSTAGRAM.value: TextMaxLength.INSTAGRAM,
+}
+
+STAGING_FIELDS = [
+    "id",
+    "platform",
+    "staged_at",
+    "post__id",
+    "post__account_id",
+    "post__description",
+    "post__media_file",
+]
+
+
+@dataclass
+class StagingResult:
+    delivery: PostDelivery
+    staged_ref: str = None
+
+
+def claim_staging_deliveries(now_utc: datetime, worker_id: str):
+    """
+    Mark deliveries due within POSTER_STAGING_SECONDS as staged by this worker.
+    Each delivery is staged at most once, a failed staging falls back to
+    doing the full work at the due time.
+    """
+    if settings.POSTER_STAGING_SECONDS <= 0:
+        return []
+
+    window_end = now_utc + timedelta(seconds=settings.POSTER_STAGING_SECONDS)
+    candidates = (
+        PostDelivery.objects.filter(
+            state=DeliveryState.PENDING,
+            attempts=0,
+            staged_at__isnull=True,
+            due_at__gt=now_utc,
+            due_at__lte=window_end,
+        )
+        .order_by("due_at")
+        .values("id")[: settings.POSTER_BATCH_SIZE]
+    )
+    claimed = PostDelivery.objects.filter(
+        id__in=candidates, staged_at__isnull=True
+    ).update(staged_at=now_utc, lease_owner=worker_id)
+    if not claimed:
+        return []
+
+    return list(
+        PostDelivery.objects.filter(
+            state=DeliveryState.PENDING, staged_at=now_utc, lease_owner=worker_id
+        )
+        .select_related("post")
+        .only(*STAGING_FIELDS)
+    )
+
+
+def validate_delivery(delivery: PostDelivery, integration: IntegrationsModel):
+    if integration is None:
+        raise ValueError(f"{delivery.platform} integration not found.")
+
+    max_length = MAX_TEXT_LENGTHS[delivery.platform]
+    if len(delivery.post.description) > max_length:
+        raise ValueError(
+            f"Maximum length of a {delivery.platform} post is {max_length}"
+        )
+
+
+async def stage_delivery(
+    delivery: PostDelivery, integration: IntegrationsModel, media: str
+):
+    try:
+        validate_delivery(delivery, integration)
+        staged_ref = await PLATFORM_STAGERS[delivery.platform](
+            integration, delivery.post.description, media
+        )
+    except Exception as err:
+        account_id = delivery.post.account_id
+        log.warning(f"{delivery.platform} staging error: {account_id} {err}")
+        send_notification(
+            "ImPosting",
+            f"AccountId: {account_id} post {delivery.post_id} may fail on "
+            f"{delivery.platform}: {str(err)}",
+        )
+        return StagingResult(delivery)
+
+    return StagingResult(delivery, staged_ref)
+
+
+def write_staging_results(results: list[StagingResult]):
+    with transaction.atomic():
+        # Skip deliveries that were edited or claimed for publishing meanwhile
+        unchanged = {
+            (delivery_id, staged_at)
+            for delivery_id, staged_at in PostDelivery.objects.filter(
+                id__in=[result.delivery.id for result in results],
+                state=DeliveryState.PENDING,
+            ).values_list("id", "staged_at")
+        }
+
+        deliveries = []
+        for result in results:
+            delivery = result.delivery
+            if (delivery.id, delivery.staged_at) not in unchanged:
+                continue
+            delivery.staged_ref = result.staged_ref
+            delivery.lease_owner = None
+            delivery.updated_at = timezone.now()
+            deliveries.append(delivery)
+
+        PostDelivery.objects.bulk_update(
+            deliveries,
+            ["staged_ref", "lease_owner", "updated_at"],
+            batch_size=settings.POSTER_BATCH_SIZE,
+        )
+
+    staged = sum(1 for result in results if result.staged_ref)
+    log.debug(f"Staged {staged} of {len(results)} upcoming deliveries.")
@@ -0,0 +1,32 @@
+from core import settings
+from core.cache import TTLCache
+from django.db.models import Min, Max
+from .models import DailyPostCounts, ScheduleVersion
+from .schedule_utils import get_month_days
+
+
+# (account_id, year) -> (schedule version, page). Storing a newer version
+# replaces the page, month styling depends on today and is not cached.
+calendar_cache = TTLCache(settings.CALENDAR_CACHE_SIZE, settings.CALENDAR_CACHE_SECONDS)
+
+
+def get_calendar_page(account_id: int, year: int):
+    """
+    Return the cached {"min_date", "max_date", "month_days"} of an account's
+    calendar year, loading it from the daily counts on a miss.
+
+    The version is the account's ScheduleVersion, so a post saved, deleted or
+    published by any process makes the next page view miss.
+    """
+    version = ScheduleVersion.get_version(account_id)
+    entry = calendar_cache.get((account_id, year))
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    account_counts = DailyPostCounts.objects.filter(account_id=account_id)
+    page = account_counts.aggregate(min_date=Min("date"), max_date=Max("date"))
+    page["month_days"] = get_month_days(
+        year, {counts.date: counts for counts in account_counts.filter(date__year=year)}
+    )
+    calendar_cache.set((account_id, year), (version, page))
+    return page
@@ -0,0 +1,19 @@
+from core.logger import log
+from django.core.management.base import BaseCommand
+from socialsched.rollup import rebuild_daily_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the calendar's daily post counts from the scheduled posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--account-id",
+            type=int,
+            default=None,
+            help="Only rebuild the counts of this account.",
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_daily_counts(options["account_id"])
+        log.info(f"Rebuilt {rows} daily post count rows.")
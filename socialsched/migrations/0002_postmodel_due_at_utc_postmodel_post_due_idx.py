@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-18 10:38
+
+from datetime import timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.db import migrations, models
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_due_at_utc(apps, schema_editor):
+    PostModel = apps.get_model("socialsched", "PostModel")
+
+    # Walk the table in primary key order so writes never disturb the read cursor
+    last_pk = 0
+    while True:
+        batch = list(
+            PostModel.objects.filter(pk__gt=last_pk)
+            .only("id", "scheduled_on", "post_timezone")
+            .order_by("pk")[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for post in batch:
+            try:
+                target_tz = ZoneInfo(post.post_timezone)
+            except (ZoneInfoNotFoundError, ValueError):
+                target_tz = dt_timezone.utc
+            post.due_at_utc = post.scheduled_on.replace(tzinfo=target_tz).astimezone(
+                dt_timezone.utc
+            )
+
+        PostModel.objects.bulk_update(batch, ["due_at_utc"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('socialsched', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmodel',
+            name='due_at_utc',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='postmodel',
+            index=models.Index(fields=['posted', 'due_at_utc'], name='post_due_idx'),
+        ),
+        migrations.RunPython(backfill_due_at_utc, migrations.RunPython.noop),
+    ]
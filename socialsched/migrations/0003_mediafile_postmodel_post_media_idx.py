@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-18 10:51
+
+import django.utils.timezone
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def index_post_media(apps, schema_editor):
+    PostModel = apps.get_model("socialsched", "PostModel")
+    MediaFile = apps.get_model("socialsched", "MediaFile")
+
+    names = (
+        PostModel.objects.exclude(media_file__isnull=True)
+        .exclude(media_file="")
+        .values_list("media_file", flat=True)
+        .distinct()
+    )
+    media_files = []
+    for name in names:
+        try:
+            size = default_storage.size(name)
+        except OSError:
+            size = 0
+        media_files.append(MediaFile(name=name, size=size))
+
+    MediaFile.objects.bulk_create(media_files, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('socialsched', '0002_postmodel_due_at_utc_postmodel_post_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1000, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'media files',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postmodel',
+            index=models.Index(fields=['media_file'], name='post_media_idx'),
+        ),
+        migrations.RunPython(index_post_media, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-18 11:15
+
+from datetime import timezone as dt_timezone
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+PLATFORM_FIELDS = {
+    "x": ("post_on_x", "link_x"),
+    "instagram": ("post_on_instagram", "link_instagram"),
+    "facebook": ("post_on_facebook", "link_facebook"),
+    "linkedin": ("post_on_linkedin", "link_linkedin"),
+}
+
+
+def get_count_annotations():
+    annotations = {"posts_count": Count("id")}
+    for platform, (flag, link) in PLATFORM_FIELDS.items():
+        published = Q(**{f"{link}__isnull": False}) & ~Q(**{link: ""})
+        annotations[f"{platform}_scheduled"] = Count(
+            "id", filter=Q(**{flag: True}) | published
+        )
+        annotations[f"{platform}_published"] = Count("id", filter=published)
+    return annotations
+
+
+def count_existing_posts(apps, schema_editor):
+    PostModel = apps.get_model("socialsched", "PostModel")
+    DailyPostCounts = apps.get_model("socialsched", "DailyPostCounts")
+
+    grouped = (
+        PostModel.objects.annotate(
+            date=TruncDate("scheduled_on", tzinfo=dt_timezone.utc)
+        )
+        .values("account_id", "date")
+        .annotate(**get_count_annotations())
+        .order_by()
+    )
+    DailyPostCounts.objects.bulk_create(
+        [DailyPostCounts(**values) for values in grouped], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('socialsched', '0003_mediafile_postmodel_post_media_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPostCounts',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.IntegerField()),
+                ('date', models.DateField()),
+                ('posts_count', models.IntegerField(default=0)),
+                ('x_scheduled', models.IntegerField(default=0)),
+                ('x_published', models.IntegerField(default=0)),
+                ('instagram_scheduled', models.IntegerField(default=0)),
+                ('instagram_published', models.IntegerField(default=0)),
+                ('facebook_scheduled', models.IntegerField(default=0)),
+                ('facebook_published', models.IntegerField(default=0)),
+                ('linkedin_scheduled', models.IntegerField(default=0)),
+                ('linkedin_published', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'daily post counts',
+                'constraints': [models.UniqueConstraint(fields=('account_id', 'date'), name='daily_counts_account_date')],
+            },
+        ),
+        migrations.RunPython(count_existing_posts, migrations.RunPython.noop),
+    ]
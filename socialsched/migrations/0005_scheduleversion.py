@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('socialsched', '0004_dailypostcounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.IntegerField(unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,11 +1,18 @@
 import os
 import uuid
-from django.db import models
+from datetime import datetime, timezone as dt_timezone
+from django.db import models, transaction
 from django.utils import timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from django.utils.timezone import is_aware
 from enum import IntEnum
-from integrations.models import IntegrationsModel, Platform
+from integrations.models import (
+    IntegrationsModel,
+    Platform,
+    PostDelivery,
+    DeliveryState,
+    OPEN_DELIVERY_STATES,
+)
 
 
 class TextMaxLength(IntEnum):
@@ -20,6 +27,30 @@ def get_filename(_, filename: str):
     return uuid.uuid4().hex + filename.lower()
 
 
+def get_due_at_utc(scheduled_on: datetime, post_timezone: str):
+    # scheduled_on holds the wall-clock time the user picked in post_timezone
+    scheduled_aware = scheduled_on.replace(tzinfo=ZoneInfo(post_timezone))
+    return scheduled_aware.astimezone(dt_timezone.utc)
+
+
+class MediaFile(models.Model):
+    """
+    Index of every uploaded media file, so unreferenced files can be
+    found without listing MEDIA_ROOT.
+    """
+
+    name = models.CharField(max_length=1000, unique=True)
+    size = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        app_label = "socialsched"
+        verbose_name_plural = "media files"
+
+    def __str__(self):
+        return f"MediaFile: {self.name} Size: {self.size}"
+
+
 class PostModel(models.Model):
     scheduled_on = models.DateTimeField()
     post_timezone = models.CharField(max_length=100)
@@ -44,13 +75,18 @@ class PostModel(models.Model):
     link_linkedin = models.CharField(max_length=50000, blank=True, null=True)
 
     posted = models.BooleanField(blank=True, null=True, default=False)
+    due_at_utc = models.DateTimeField(blank=True, null=True, editable=False)
 
     def save(self, *args, **kwargs):
 
         skip_validation = kwargs.pop("skip_validation", False)
 
         if skip_validation:
-            super().save(*args, **kwargs)
+            self.due_at_utc = get_due_at_utc(self.scheduled_on, self.post_timezone)
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self.sync_deliveries()
+            return
 
         if not any(
             [
@@ -79,11 +115,15 @@ class PostModel(models.Model):
 
         postlen = len(self.description)
 
+        authorized = set(
+            IntegrationsModel.objects.filter(
+                account_id=self.account_id,
+                platform__in=self.get_selected_platforms(),
+            ).values_list("platform", flat=True)
+        )
+
         if self.post_on_x:
-            x_ok = IntegrationsModel.objects.filter(
-                account_id=self.account_id, platform=Platform.X_TWITTER.value
-            ).first()
-            if not x_ok:
+            if Platform.X_TWITTER.value not in authorized:
                 raise ValueError("Please got to Integrations and authorize X app")
             if postlen > TextMaxLength.X_BLUE:
                 raise ValueError(
@@ -91,10 +131,7 @@ class PostModel(models.Model):
                 )
 
         if self.post_on_instagram:
-            ig_ok = IntegrationsModel.objects.filter(
-                account_id=self.account_id, platform=Platform.INSTAGRAM.value
-            ).first()
-            if not ig_ok:
+            if Platform.INSTAGRAM.value not in authorized:
                 raise ValueError(
                     "Please got to Integrations and authorize Facebook/Instagram app"
                 )
@@ -106,10 +143,7 @@ class PostModel(models.Model):
                 raise ValueError("On Instagram media file is required.")
 
         if self.post_on_facebook:
-            fb_ok = IntegrationsModel.objects.filter(
-                account_id=self.account_id, platform=Platform.FACEBOOK.value
-            ).first()
-            if not fb_ok:
+            if Platform.FACEBOOK.value not in authorized:
                 raise ValueError(
                     "Please got to Integrations and authorize Facebook/Instagram app"
                 )
@@ -119,10 +153,7 @@ class PostModel(models.Model):
                 )
 
         if self.post_on_linkedin:
-            ld_ok = IntegrationsModel.objects.filter(
-                account_id=self.account_id, platform=Platform.LINKEDIN.value
-            ).first()
-            if not ld_ok:
+            if Platform.LINKEDIN.value not in authorized:
                 raise ValueError(
                     "Please got to Integrations and authorize LinkedIn app"
                 )
@@ -131,11 +162,155 @@ class PostModel(models.Model):
                     f"Maximum length of a LinkedIn post is {TextMaxLength.LINKEDIN}"
                 )
 
-        super().save(*args, **kwargs)
+        self.due_at_utc = get_due_at_utc(self.scheduled_on, self.post_timezone)
+
+        # A poster tick never sees the post without its matching deliveries
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_deliveries()
+        self.register_media_file()
+
+    def register_media_file(self):
+        if not self.media_file:
+            return
+        try:
+            size = self.media_file.size
+        except OSError:
+            # The post can still name a file that is already gone from disk
+            size = 0
+        MediaFile.objects.get_or_create(
+            name=self.media_file.name, defaults={"size": size}
+        )
+
+    def get_selected_platforms(self):
+        return [
+            platform
+            for platform, selected in (
+                (Platform.X_TWITTER.value, self.post_on_x),
+                (Platform.LINKEDIN.value, self.post_on_linkedin),
+                (Platform.FACEBOOK.value, self.post_on_facebook),
+                (Platform.INSTAGRAM.value, self.post_on_instagram),
+            )
+            if selected
+        ]
+
+    def sync_deliveries(self):
+        """
+        Keep one delivery row per selected platform.
+        Pending deliveries of deselected platforms are cancelled, also while
+        they wait on a retry. Deliveries already sent or failed are left as they are.
+        """
+        now = timezone.now()
+        selected = self.get_selected_platforms()
+        deliveries = PostDelivery.objects.filter(post_id=self.id)
+        pending = deliveries.filter(state=DeliveryState.PENDING)
+
+        pending.exclude(platform__in=selected).delete()
+        # Staged media may not match the edited post anymore
+        pending.filter(attempts=0).update(
+            due_at=self.due_at_utc,
+            staged_ref=None,
+            staged_at=None,
+            updated_at=now,
+        )
+        # A retry keeps its backoff but never goes out before the post's new time
+        pending.filter(attempts__gt=0, due_at__lt=self.due_at_utc).update(
+            due_at=self.due_at_utc, updated_at=now
+        )
+
+        existing = set(deliveries.values_list("platform", flat=True))
+        PostDelivery.objects.bulk_create(
+            [
+                PostDelivery(post_id=self.id, platform=platform, due_at=self.due_at_utc)
+                for platform in selected
+                if platform not in existing
+            ],
+            ignore_conflicts=True,
+        )
+
+        posted = not deliveries.filter(state__in=OPEN_DELIVERY_STATES).exists()
+        if self.posted != posted:
+            self.posted = posted
+            PostModel.objects.filter(id=self.id).update(posted=posted)
 
     class Meta:
         app_label = "socialsched"
         verbose_name_plural = "scheduled"
+        indexes = [
+            models.Index(fields=["posted", "due_at_utc"], name="post_due_idx"),
+            models.Index(fields=["media_file"], name="post_media_idx"),
+        ]
 
     def __str__(self):
         return f"AccountId:{self.account_id} PostScheduledOn: {self.scheduled_on}"
+
+
+class DailyPostCounts(models.Model):
+    """
+    Posts per account and UTC day, kept up to date as posts are saved,
+    deleted and published so the calendar never aggregates PostModel.
+    A platform is scheduled if it is selected or was already posted on.
+    """
+
+    account_id = models.IntegerField()
+    date = models.DateField()
+    posts_count = models.IntegerField(default=0)
+
+    x_scheduled = models.IntegerField(default=0)
+    x_published = models.IntegerField(default=0)
+    instagram_scheduled = models.IntegerField(default=0)
+    instagram_published = models.IntegerField(default=0)
+    facebook_scheduled = models.IntegerField(default=0)
+    facebook_published = models.IntegerField(default=0)
+    linkedin_scheduled = models.IntegerField(default=0)
+    linkedin_published = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = "socialsched"
+        verbose_name_plural = "daily post counts"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account_id", "date"], name="daily_counts_account_date"
+            )
+        ]
+
+    def __str__(self):
+        return f"AccountId:{self.account_id} PostsOn: {self.date} ({self.posts_count})"
+
+
+class ScheduleVersion(models.Model):
+    """
+    Bumped whenever an account's calendar counts change, so cached
+    calendars of any process can tell they are out of date.
+    """
+
+    account_id = models.IntegerField(unique=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        app_label = "socialsched"
+
+    def __str__(self):
+        return f"AccountId:{self.account_id} Version: {self.version}"
+
+    @staticmethod
+    def get_version(account_id: int):
+        return (
+            ScheduleVersion.objects.filter(account_id=account_id)
+            .values_list("version", flat=True)
+            .first()
+            or 0
+        )
+
+    @staticmethod
+    def bump(account_ids):
+        account_ids = set(account_ids)
+        if not account_ids:
+            return
+        ScheduleVersion.objects.bulk_create(
+            [ScheduleVersion(account_id=account_id) for account_id in account_ids],
+            ignore_conflicts=True,
+        )
+        ScheduleVersion.objects.filter(account_id__in=account_ids).update(
+            version=models.F("version") + 1
+        )
@@ -0,0 +1,149 @@
+from collections import Counter, defaultdict
+from datetime import timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import PostModel, DailyPostCounts, ScheduleVersion
+
+
+# Rollup platform prefix -> (scheduled flag, link) of the platform
+PLATFORM_FIELDS = {
+    "x": ("post_on_x", "link_x"),
+    "instagram": ("post_on_instagram", "link_instagram"),
+    "facebook": ("post_on_facebook", "link_facebook"),
+    "linkedin": ("post_on_linkedin", "link_linkedin"),
+}
+
+COUNT_FIELDS = ["posts_count"] + [
+    f"{platform}_{state}"
+    for platform in PLATFORM_FIELDS
+    for state in ("scheduled", "published")
+]
+
+POST_FIELDS = ["account_id", "scheduled_on"] + [
+    field for fields in PLATFORM_FIELDS.values() for field in fields
+]
+
+
+def get_count_annotations():
+    """Aggregates that count a group of posts the way get_post_counts does."""
+    annotations = {"posts_count": Count("id")}
+    for platform, (flag, link) in PLATFORM_FIELDS.items():
+        published = Q(**{f"{link}__isnull": False}) & ~Q(**{link: ""})
+        annotations[f"{platform}_scheduled"] = Count(
+            "id", filter=Q(**{flag: True}) | published
+        )
+        annotations[f"{platform}_published"] = Count("id", filter=published)
+    return annotations
+
+
+def get_post_values(post: PostModel):
+    return {field: getattr(post, field) for field in POST_FIELDS}
+
+
+def get_post_counts(values: dict):
+    """Return the rollup key of a post and what it adds to that day."""
+    scheduled_on = values["scheduled_on"]
+    if timezone.is_naive(scheduled_on):
+        scheduled_on = timezone.make_aware(scheduled_on, dt_timezone.utc)
+    key = (values["account_id"], scheduled_on.astimezone(dt_timezone.utc).date())
+
+    counts = Counter(posts_count=1)
+    for platform, (flag, link) in PLATFORM_FIELDS.items():
+        if values[link]:
+            counts[f"{platform}_scheduled"] += 1
+            counts[f"{platform}_published"] += 1
+        elif values[flag]:
+            counts[f"{platform}_scheduled"] += 1
+    return key, counts
+
+
+def get_count_changes(before: list[dict], after: list[dict]):
+    changes = defaultdict(Counter)
+    for values in before:
+        key, counts = get_post_counts(values)
+        changes[key].subtract(counts)
+    for values in after:
+        key, counts = get_post_counts(values)
+        changes[key].update(counts)
+    return changes
+
+
+def apply_count_changes(changes: dict):
+    """
+    Add count deltas to their day rows, creating missing rows and dropping
+    days left without posts. Accounts whose counts changed get a new
+    schedule version.
+    """
+    changes = {key: delta for key, delta in changes.items() if any(delta.values())}
+    if not changes:
+        return
+
+    with transaction.atomic():
+        existing = {
+            (row.account_id, row.date): row
+            for row in DailyPostCounts.objects.filter(
+                account_id__in={account_id for account_id, _ in changes},
+                date__in={day for _, day in changes},
+            )
+        }
+
+        to_create = []
+        to_update = []
+        to_delete = []
+        for key, delta in changes.items():
+            row = existing.get(key)
+            if row is None:
+                row = DailyPostCounts(account_id=key[0], date=key[1])
+            for field, value in delta.items():
+                setattr(row, field, max(getattr(row, field) + value, 0))
+
+            if row.posts_count == 0:
+                if row.pk:
+                    to_delete.append(row.pk)
+            elif row.pk:
+                to_update.append(row)
+            else:
+                to_create.append(row)
+
+        DailyPostCounts.objects.bulk_create(to_create)
+        DailyPostCounts.objects.bulk_update(to_update, COUNT_FIELDS)
+        DailyPostCounts.objects.filter(pk__in=to_delete).delete()
+        ScheduleVersion.bump(account_id for account_id, _ in changes)
+
+
+def record_post_links(post_links: dict[int, dict]):
+    """
+    Count links the poster is about to write, post id -> {link field: url}.
+    Call it before the links are saved so the previous values are still there.
+    """
+    before = list(
+        PostModel.objects.filter(id__in=list(post_links)).values("id", *POST_FIELDS)
+    )
+    after = [{**values, **post_links[values["id"]]} for values in before]
+    apply_count_changes(get_count_changes(before, after))
+
+
+def rebuild_daily_counts(account_id: int = None):
+    """Recount the rollup from PostModel, for one account or all of them."""
+    posts = PostModel.objects.all()
+    rows = DailyPostCounts.objects.all()
+    if account_id is not None:
+        posts = posts.filter(account_id=account_id)
+        rows = rows.filter(account_id=account_id)
+
+    grouped = (
+        posts.annotate(date=TruncDate("scheduled_on", tzinfo=dt_timezone.utc))
+        .values("account_id", "date")
+        .annotate(**get_count_annotations())
+        .order_by()
+    )
+    with transaction.atomic():
+        account_ids = set(rows.values_list("account_id", flat=True))
+        rows.delete()
+        created = DailyPostCounts.objects.bulk_create(
+            [DailyPostCounts(**values) for values in grouped], batch_size=1000
+        )
+        ScheduleVersion.bump(account_ids | {row.account_id for row in created})
+    return len(created)
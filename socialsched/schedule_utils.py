@@ -1,5 +1,6 @@
 from functools import lru_cache
 from datetime import date, timedelta
+from .models import DailyPostCounts
 
 
 @lru_cache(maxsize=None)
@@ -44,50 +45,47 @@ def get_initial_month_placeholder(today, d):
     }
 
 
-def get_day_data(posts, d):
-    posts_count = 0
-    post_on_x = 0
-    post_on_instagram = 0
-    post_on_facebook = 0
-    post_on_linkedin = 0
-    for post in posts:
-
-        if post["scheduled_on"].date() != d:
-            continue
-
-        post_on_x += 1 if post["post_on_x"] or post["link_x"] else 0
-        post_on_instagram += (
-            1 if post["post_on_instagram"] or post["link_instagram"] else 0
-        )
-        post_on_facebook += (
-            1 if post["post_on_facebook"] or post["link_facebook"] else 0
-        )
-        post_on_linkedin += (
-            1 if post["post_on_linkedin"] or post["link_linkedin"] else 0
-        )
-        posts_count += (
-            1
-            if any(
-                [
-                    post["post_on_x"],
-                    post["post_on_instagram"],
-                    post["post_on_facebook"],
-                    post["post_on_linkedin"],
-                    post["link_x"],
-                    post["link_instagram"],
-                    post["link_facebook"],
-                    post["link_linkedin"],
-                ]
-            )
-            else 0
-        )
+# Template keys of the months, in calendar order
+MONTH_KEYS = [
+    "january",
+    "february",
+    "march",
+    "april",
+    "may",
+    "june",
+    "july",
+    "august",
+    "september",
+    "octomber",
+    "november",
+    "december",
+]
 
+def get_day_data(d: date, counts: DailyPostCounts = None):
     return {
         "isodate": d.isoformat(),
         "day": f"{d.day:02}",
-        "posts_count": posts_count,
-        "instagram_count": post_on_instagram,
-        "facebook_count": post_on_facebook,
-        "linkedin_count": post_on_linkedin,
-        "twitter_count": post_on_x,
+        "posts_count": getattr(counts, "posts_count", 0),
+        "instagram_count": getattr(counts, "instagram_scheduled", 0),
+        "facebook_count": getattr(counts, "facebook_scheduled", 0),
+        "linkedin_count": getattr(counts, "linkedin_scheduled", 0),
+        "twitter_count": getattr(counts, "x_scheduled", 0),
     }
+
+
+def get_month_days(year: int, day_counts: dict[date, DailyPostCounts]):
+    """Return month key -> day data, nothing in it depends on today's date."""
+    month_days = {month_key: [] for month_key in MONTH_KEYS}
+    for d in get_year_dates(year):
+        month_days[MONTH_KEYS[d.month - 1]].append(get_day_data(d, day_counts.get(d)))
+    return month_days
+
+
+def get_calendar_data(today, year: int, month_days: dict[str, list]):
+    calendar_data = {}
+    for month, month_key in enumerate(MONTH_KEYS, start=1):
+        calendar_data[month_key] = {
+            **get_initial_month_placeholder(today, date(year, month, 1)),
+            "days": month_days[month_key],
+        }
+    return calendar_data
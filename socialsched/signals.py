@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from integrations.scheduler import notify_poster
+from .models import PostModel
+from .rollup import (
+    POST_FIELDS,
+    get_post_values,
+    get_count_changes,
+    apply_count_changes,
+)
+
+
+@receiver(post_save, sender=PostModel)
+@receiver(post_delete, sender=PostModel)
+def wake_up_poster(sender, instance, **kwargs):
+    transaction.on_commit(notify_poster)
+
+
+@receiver(pre_save, sender=PostModel)
+def read_stored_counts(sender, instance, **kwargs):
+    # What the post counted for before this save, it may have moved to another day
+    instance._stored_values = None
+    if instance.pk:
+        instance._stored_values = (
+            PostModel.objects.filter(pk=instance.pk).values(*POST_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=PostModel)
+def update_daily_counts_on_save(sender, instance, **kwargs):
+    stored_values = getattr(instance, "_stored_values", None)
+    apply_count_changes(
+        get_count_changes(
+            [stored_values] if stored_values else [], [get_post_values(instance)]
+        )
+    )
+
+
+@receiver(post_delete, sender=PostModel)
+def update_daily_counts_on_delete(sender, instance, **kwargs):
+    apply_count_changes(get_count_changes([get_post_values(instance)], []))
@@ -3,17 +3,13 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import logout
 from django.utils import timezone
-from django.db.models import Min, Max
 from social_django.models import UserSocialAuth
 from datetime import datetime, timedelta
 from .instagram_image import make_instagram_image
 from .models import PostModel
 from .forms import PostForm
-from .schedule_utils import (
-    get_day_data,
-    get_initial_month_placeholder,
-    get_year_dates,
-)
+from .schedule_utils import get_calendar_data
+from .calendar_cache import get_calendar_page
 
 
 @login_required
@@ -26,13 +22,9 @@ def calendar(request):
     if request.GET.get("year") is not None:
         selected_year = int(request.GET.get("year"))
 
-    min_date = PostModel.objects.filter(account_id=social_uid).aggregate(
-        Min("scheduled_on")
-    )["scheduled_on__min"]
-
-    max_date = PostModel.objects.filter(account_id=social_uid).aggregate(
-        Max("scheduled_on")
-    )["scheduled_on__max"]
+    calendar_page = get_calendar_page(social_uid, selected_year)
+    min_date = calendar_page["min_date"]
+    max_date = calendar_page["max_date"]
 
     min_year = min_date.year if min_date else today.year
     max_year = max_date.year if max_date else today.year
@@ -40,95 +32,8 @@ def calendar(request):
     select_years = list(set([min_year, max_year, today.year, today.year + 4]))
     select_years = [y for y in range(min(select_years), max(select_years), 1)]
 
-    posts = PostModel.objects.filter(
-        account_id=social_uid, scheduled_on__year=selected_year
-    ).values(
-        "scheduled_on",
-        "post_on_x",
-        "post_on_instagram",
-        "post_on_facebook",
-        "post_on_linkedin",
-        "link_x",
-        "link_instagram",
-        "link_facebook",
-        "link_linkedin",
-    )
-
-    year_dates = get_year_dates(selected_year)
-
-    calendar_data = {}
-    for d in year_dates:
-        if d.month == 1:
-            if "january" not in calendar_data:
-                calendar_data["january"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["january"]["days"].append(day_data)
-
-        if d.month == 2:
-            if "february" not in calendar_data:
-                calendar_data["february"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["february"]["days"].append(day_data)
-
-        if d.month == 3:
-            if "march" not in calendar_data:
-                calendar_data["march"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["march"]["days"].append(day_data)
-
-        if d.month == 4:
-            if "april" not in calendar_data:
-                calendar_data["april"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["april"]["days"].append(day_data)
-
-        if d.month == 5:
-            if "may" not in calendar_data:
-                calendar_data["may"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["may"]["days"].append(day_data)
-
-        if d.month == 6:
-            if "june" not in calendar_data:
-                calendar_data["june"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["june"]["days"].append(day_data)
-
-        if d.month == 7:
-            if "july" not in calendar_data:
-                calendar_data["july"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["july"]["days"].append(day_data)
-
-        if d.month == 8:
-            if "august" not in calendar_data:
-                calendar_data["august"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["august"]["days"].append(day_data)
-
-        if d.month == 9:
-            if "september" not in calendar_data:
-                calendar_data["september"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["september"]["days"].append(day_data)
-
-        if d.month == 10:
-            if "octomber" not in calendar_data:
-                calendar_data["octomber"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["octomber"]["days"].append(day_data)
-
-        if d.month == 11:
-            if "november" not in calendar_data:
-                calendar_data["november"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["november"]["days"].append(day_data)
-
-        if d.month == 12:
-            if "december" not in calendar_data:
-                calendar_data["december"] = get_initial_month_placeholder(today, d)
-            day_data = get_day_data(posts, d)
-            calendar_data["december"]["days"].append(day_data)
+    # Cached day counts, the month styling depends on today
+    calendar_data = get_calendar_data(today, selected_year, calendar_page["month_days"])
 
     return render(
         request,